@@ -0,0 +1,293 @@
+"""Benchmarks for the evaluation and search hot paths
+
+Every benchmark runs with fixed seeds on the capitals and on synthetic instances of
+random cities in Europe, and reports the time per call and the peak memory allocated
+during one call. Results are written as JSON, and can be compared against a saved
+baseline to catch regressions.
+
+Usage
+-----
+    python benchmarks.py run --output baseline.json
+    python benchmarks.py run --sizes 44 200 --compare baseline.json
+    python benchmarks.py compare baseline.json current.json --threshold 0.2
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import typing
+
+import numpy as np
+
+from tsp import TSP, haversine
+from ga import GeneticAlgorithm
+from randomSearch import RandomSearch
+
+SEED = 42
+SIZES = (44, 200, 1000, 10000)
+POPULATIONS = (30, 300)
+
+
+def make_instance(size: int) -> TSP:
+    """The capitals for size 44, otherwise size random cities in Europe with a fixed seed"""
+
+    if size == 44:
+        return TSP(plot=False)
+    rng = np.random.default_rng(SEED + size)
+    coordinates = np.column_stack([rng.uniform(-10, 30, size), rng.uniform(36, 64, size)])
+    return TSP(plot=False, coordinates=coordinates)
+
+
+def measure(
+    function: typing.Callable[[], typing.Any], min_time: float = 0.2, repeat: int = 5
+) -> typing.Dict[str, float]:
+    """Time a function, and measure the peak memory allocated during one call
+
+    Parameters
+    ----------
+    function: callable
+        Function without arguments to measure
+    min_time: float = 0.2 (optional)
+        Every repetition calls the function as often as needed to take at least this long
+    repeat: int = 5 (optional)
+        The number of repetitions, the fastest one is reported
+
+    Returns
+    -------
+        dict
+            seconds per call (best and median over the repetitions), calls per repetition
+            and peak_bytes
+    """
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_time / elapsed * 1.2))
+
+    times = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return {
+        "seconds": min(times),
+        "median_seconds": float(np.median(times)),
+        "calls": number,
+        "peak_bytes": peak,
+    }
+
+
+def benchmarks(tsp: TSP, population: int) -> typing.Dict[str, typing.Callable[[], typing.Any]]:
+    """The benchmarks for one instance and population size, every one with fixed inputs. The GA
+    generation restores the initial population and rng state before every call, the copies
+    are included in its time."""
+
+    rng = np.random.default_rng(SEED)
+    dim = tsp.dim
+    paths = np.argsort(rng.random((population, dim)), axis=1)
+    path = paths[0]
+    mutations = rng.integers(dim, size=(population, 2))
+    mutations[:, 1] = rng.integers(dim - 1, size=population)
+    mutations[:, 1] += mutations[:, 1] >= mutations[:, 0]
+    partners = np.roll(paths, 1, axis=0)
+    starts = rng.integers(dim, size=population)
+    ends = rng.integers(starts, dim + 1)
+
+    geneticAlgorithm = GeneticAlgorithm(nPaths=population, rng=np.random.default_rng(SEED), verbose=False)
+    geneticAlgorithm.initialize(tsp)
+    # every call times the same first generation, however often measure calls it
+    initialPaths = geneticAlgorithm.population.paths.copy()
+    initialDistances = geneticAlgorithm.population.distances.copy()
+    initialState = geneticAlgorithm.rng.bit_generator.state
+
+    def ga_generation():
+        geneticAlgorithm.population.paths[:] = initialPaths
+        geneticAlgorithm.population.distances[:] = initialDistances
+        geneticAlgorithm.rng.bit_generator.state = initialState
+        geneticAlgorithm.epoch = geneticAlgorithm.unchangedIterations = 0
+        geneticAlgorithm.history = geneticAlgorithm.history[:1]
+        geneticAlgorithm.step()
+
+    def random_search():
+        RandomSearch(population * 10, rng=np.random.default_rng(SEED))(tsp)
+
+    return {
+        "evaluate": lambda: tsp(path),
+        "evaluate_batch": lambda: tsp.evaluate_batch(paths),
+        "haversine": lambda: haversine(*tsp.coordinates[0], *tsp.coordinates[1]),
+        "delta_swap": lambda: tsp.delta_batch(paths, "swap", mutations),
+        "delta_inversion": lambda: tsp.delta_batch(paths, "inversion", mutations),
+        "swap": lambda: GeneticAlgorithm.swapBatch(paths, mutations),
+        "inversion": lambda: GeneticAlgorithm.inversionBatch(paths, mutations),
+        "crossover": lambda: GeneticAlgorithm.crossoverBatch(paths, partners, starts, ends),
+        "ga_generation": ga_generation,
+        "random_search": random_search,
+    }
+
+
+def run(
+    sizes: typing.Sequence[int] = SIZES,
+    populations: typing.Sequence[int] = POPULATIONS,
+    names: typing.Sequence[str] = None,
+    min_time: float = 0.2,
+) -> dict:
+    """Run the benchmarks for all instance sizes and population sizes
+
+    Returns
+    -------
+        dict
+            Information on the machine, and a list of results with the name, size,
+            population and the measurements of every benchmark
+    """
+    results = []
+    for size in sizes:
+        tsp = make_instance(size)
+        for population in populations:
+            for name, function in benchmarks(tsp, population).items():
+                if names and name not in names:
+                    continue
+                result = {"name": name, "size": size, "population": population}
+                result.update(measure(function, min_time))
+                results.append(result)
+                print(
+                    f"{name:>16} size={size:<6} population={population:<6}"
+                    f"{result['seconds'] * 1e6:12.1f} us {result['peak_bytes'] / 2**20:10.2f} MiB",
+                    file=sys.stderr,
+                )
+    return {
+        "machine": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "seed": SEED,
+        "results": results,
+    }
+
+
+def relative_change(before: float, after: float) -> float:
+    """after / before - 1, or infinite if only after is non-zero"""
+
+    if before > 0:
+        return after / before - 1
+    return 0.0 if after <= 0 else float("inf")
+
+
+def compare(
+    baseline: dict, current: dict, threshold: float = 0.1, memory_threshold: float = 0.1
+) -> typing.List[dict]:
+    """Compare two benchmark runs
+
+    Parameters
+    ----------
+    baseline: dict
+    current: dict
+        Results of run
+    threshold: float = 0.1 (optional)
+        Relative slowdown above which a benchmark is a regression
+    memory_threshold: float = 0.1 (optional)
+        Relative growth of the peak memory above which a benchmark is a regression
+
+    Returns
+    -------
+        list[dict]
+            The benchmarks in both runs, with their relative change in time and peak
+            memory and whether they regressed
+    """
+    key = lambda result: (result["name"], result["size"], result["population"])
+    reference = {key(result): result for result in baseline["results"]}
+    comparison = []
+    for result in current["results"]:
+        if key(result) not in reference:
+            continue
+        before = reference[key(result)]
+        change = relative_change(before["seconds"], result["seconds"])
+        memory_change = relative_change(before["peak_bytes"], result["peak_bytes"])
+        comparison.append(
+            {
+                "name": result["name"],
+                "size": result["size"],
+                "population": result["population"],
+                "baseline_seconds": before["seconds"],
+                "seconds": result["seconds"],
+                "change": change,
+                "baseline_peak_bytes": before["peak_bytes"],
+                "peak_bytes": result["peak_bytes"],
+                "memory_change": memory_change,
+                "regression": change > threshold or memory_change > memory_threshold,
+            }
+        )
+    return comparison
+
+
+def report(comparison: typing.List[dict]) -> bool:
+    """Print a comparison, returns whether there are regressions"""
+
+    for row in comparison:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['name']:>16} size={row['size']:<6} population={row['population']:<6}"
+            f"{row['baseline_seconds'] * 1e6:12.1f} us -> {row['seconds'] * 1e6:12.1f} us"
+            f"{row['change']:+8.1%}"
+            f"{row['baseline_peak_bytes'] / 2**20:10.2f} MiB -> {row['peak_bytes'] / 2**20:10.2f} MiB"
+            f"{row['memory_change']:+8.1%} {flag}"
+        )
+    return any(row["regression"] for row in comparison)
+
+
+def main(argv: typing.Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    run_parser.add_argument("--populations", type=int, nargs="+", default=POPULATIONS)
+    run_parser.add_argument("--names", nargs="+", help="only run these benchmarks")
+    run_parser.add_argument("--min-time", type=float, default=0.2)
+    run_parser.add_argument("--output", help="write the results as JSON to this file")
+    run_parser.add_argument("--compare", help="baseline JSON file to compare the results with")
+    run_parser.add_argument("--threshold", type=float, default=0.1)
+    run_parser.add_argument("--memory-threshold", type=float, default=0.1)
+
+    compare_parser = commands.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    compare_parser.add_argument("--memory-threshold", type=float, default=0.1)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        current = run(args.sizes, args.populations, args.names, args.min_time)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(current, f, indent=1)
+        else:
+            print(json.dumps(current, indent=1))
+        if not args.compare:
+            return 0
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+    return int(report(compare(baseline, current, args.threshold, args.memory_threshold)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
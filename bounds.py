@@ -0,0 +1,184 @@
+"""Exact solutions and lower bounds for TSP objects
+
+held_karp solves (sub-)instances of up to about 20 cities exactly with the bitmask dynamic
+program of Held and Karp, in O(2**n * n**2) time and O(2**n * n) memory.
+
+one_tree_bound gives a lower bound on the length of any tour of larger instances: the
+Held-Karp 1-tree bound, a minimum spanning tree of the cities plus the two shortest edges
+to the depot, with node penalties that are optimized by subgradient ascent. The distances
+are read one row at a time, so the bound works with every distance backend.
+"""
+
+import typing
+
+import numpy as np
+
+if typing.TYPE_CHECKING:
+    from tsp import TSP
+
+HELD_KARP_MAX = 20
+
+
+def _rows(tsp: "TSP", nodes: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    """Distances from nodes to columns, in float64"""
+
+    return np.asarray(tsp.distances[nodes[:, None], columns[None, :]], dtype=float)
+
+
+def held_karp(tsp: "TSP", cities: np.ndarray = None) -> typing.Tuple[np.ndarray, float]:
+    """Shortest tour from the depot through the given cities and back
+
+    Parameters
+    ----------
+    tsp: TSP
+        The problem
+    cities: np.ndarray[int] (optional)
+        The cities to visit, all cities by default. At most HELD_KARP_MAX.
+
+    Returns
+    -------
+        np.ndarray
+            The optimal path, a permutation of cities
+        float
+            Its length
+    """
+    cities = np.arange(tsp.dim) if cities is None else np.asarray(cities)
+    m = len(cities)
+    if m > HELD_KARP_MAX:
+        raise ValueError(f"Held-Karp is limited to {HELD_KARP_MAX} cities, not {m}")
+    if m == 0:
+        return cities, 0.0
+    nodes = np.append(cities, tsp.depot)
+    d = _rows(tsp, nodes, nodes)  # the depot is node m
+
+    # dp[mask, j]: shortest path from the depot through the cities in mask, ending at j
+    full = 1 << m
+    dp = np.full((full, m), np.inf)
+    parent = np.zeros((full, m), dtype=np.int8)
+    dp[1 << np.arange(m), np.arange(m)] = d[m, :m]
+    masks = np.arange(full)
+    size = np.zeros(full, dtype=np.int8)
+    for j in range(m):
+        size += (masks >> j) & 1
+    for k in range(2, m + 1):
+        subsets = masks[size == k]
+        for j in range(m):
+            ending = subsets[(subsets >> j) & 1 == 1]
+            lengths = dp[ending ^ (1 << j)] + d[:m, j]
+            previous = np.argmin(lengths, axis=1)
+            dp[ending, j] = lengths[np.arange(len(ending)), previous]
+            parent[ending, j] = previous
+
+    lengths = dp[full - 1] + d[:m, m]
+    j = int(np.argmin(lengths))
+    length = float(lengths[j])
+    order, mask = [], full - 1
+    while mask:
+        order.append(j)
+        mask, j = mask ^ (1 << j), int(parent[mask, j])
+    return cities[order[::-1]], length
+
+
+def _nearest_neighbor_length(tsp: "TSP") -> float:
+    """Length of the nearest neighbour tour from the depot, an upper bound on the optimum"""
+
+    cities = np.arange(tsp.dim)
+    visited = np.zeros(tsp.dim, dtype=bool)
+    node, length = tsp.depot, 0.0
+    for _ in range(tsp.dim):
+        row = np.where(visited, np.inf, _rows(tsp, np.array([node]), cities)[0])
+        node = int(np.argmin(row))
+        length += row[node]
+        visited[node] = True
+    return length + float(tsp.distances[node, tsp.depot])
+
+
+def _one_tree(tsp: "TSP", pi: np.ndarray) -> typing.Tuple[float, np.ndarray]:
+    """Minimum 1-tree for the distances d[i, j] + pi[i] + pi[j], with the depot as the
+    special node. Returns its length and the degree of every node."""
+
+    n = tsp.dim
+    cities = np.arange(n)
+    degree = np.zeros(n + 1, dtype=np.int64)
+    in_tree = np.zeros(n, dtype=bool)
+    key = np.full(n, np.inf)
+    parent = np.zeros(n, dtype=np.int64)
+    # Prim's algorithm on the cities, fetching the row of every node that joins the tree
+    node, total = 0, 0.0
+    in_tree[0] = True
+    for _ in range(n - 1):
+        weights = _rows(tsp, np.array([node]), cities)[0] + pi[node] + pi[:n]
+        closer = ~in_tree & (weights < key)
+        key[closer] = weights[closer]
+        parent[closer] = node
+        node = int(np.argmin(np.where(in_tree, np.inf, key)))
+        in_tree[node] = True
+        total += key[node]
+        degree[node] += 1
+        degree[parent[node]] += 1
+    # the two shortest edges of the depot
+    weights = _rows(tsp, np.array([tsp.depot]), cities)[0] + pi[tsp.depot] + pi[:n]
+    nearest = np.argpartition(weights, 1)[:2]
+    total += weights[nearest].sum()
+    degree[nearest] += 1
+    degree[tsp.depot] = 2
+    return total, degree
+
+
+def one_tree_bound(
+    tsp: "TSP",
+    iterations: int = 200,
+    upper_bound: float = None,
+    patience: int = 10,
+) -> float:
+    """Held-Karp lower bound on the length of the shortest tour
+
+    Parameters
+    ----------
+    tsp: TSP
+        The problem, with at least two cities
+    iterations: int = 200 (optional)
+        The maximum number of subgradient steps, every step computes one 1-tree with
+        O(n**2) distance lookups. The default takes seconds at 1000 cities and about half a
+        minute at 3000, use fewer iterations (a weaker bound) for larger instances.
+    upper_bound: float (optional)
+        The length of a known tour, used for the step size. By default the length of the
+        nearest neighbour tour.
+    patience: int = 10 (optional)
+        The step size is halved after this many steps without a better bound
+
+    Returns
+    -------
+        float
+            A lower bound on the length of every tour
+    """
+    if tsp.dim < 2:
+        raise ValueError("The 1-tree bound needs at least two cities")
+    if upper_bound is None:
+        upper_bound = _nearest_neighbor_length(tsp)
+    pi = np.zeros(tsp.dim + 1)
+    best, scale, stale = -np.inf, 2.0, 0
+    for _ in range(iterations):
+        total, degree = _one_tree(tsp, pi)
+        bound = total - 2 * pi.sum()
+        if bound > best:
+            best, stale = bound, 0
+        else:
+            stale += 1
+            if stale >= patience:
+                scale, stale = scale / 2, 0
+        subgradient = degree - 2
+        norm = (subgradient**2).sum()
+        if norm == 0 or scale < 1e-6 or best >= upper_bound:
+            break  # the 1-tree is a tour, so it is optimal, or the steps became too small
+        pi += scale * (upper_bound - bound) / norm * subgradient
+    return float(min(best, upper_bound))
+
+
+def lower_bound(tsp: "TSP", exact_limit: int = 12, **kwargs) -> float:
+    """Lower bound on the length of the shortest tour: the exact optimum (see held_karp) for
+    instances of at most exact_limit cities, otherwise one_tree_bound with kwargs"""
+
+    if tsp.dim <= exact_limit:
+        return held_karp(tsp)[1]
+    return one_tree_bound(tsp, **kwargs)
@@ -0,0 +1,143 @@
+"""Checkpoints and on-disk convergence histories for long runs
+
+A checkpoint is a single uncompressed .npz file with the population, its distances, the
+state of the random number generator and the counters of a run. It is written to a
+temporary file first and then moved into place, so a run that is killed while writing
+leaves the previous checkpoint intact.
+
+A DiskHistory is an append-only array of float64 values in a raw binary file. Values are
+buffered in a small chunk and appended to the file when the chunk is full, so the memory
+use does not grow with the length of the run.
+"""
+
+import json
+import os
+import typing
+
+import numpy as np
+
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(path: str, arrays: typing.Dict[str, np.ndarray], state: dict) -> None:
+    """Atomically write a checkpoint
+
+    Parameters
+    ----------
+    path: str
+        File to write, conventionally with the extension .npz
+    arrays: dict
+        Named arrays to store, such as the population
+    state: dict
+        JSON serializable counters and settings, such as the epoch and the rng state
+    """
+    state = dict(state, version=CHECKPOINT_VERSION)
+    partial = f"{path}.{os.getpid()}.partial"
+    with open(partial, "wb") as f:
+        np.savez(f, state=np.array(json.dumps(state, default=np.ndarray.tolist)), **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+
+
+def load_checkpoint(path: str) -> typing.Tuple[typing.Dict[str, np.ndarray], dict]:
+    """Read a checkpoint written by save_checkpoint
+
+    Returns
+    -------
+        dict
+            The named arrays
+        dict
+            The counters and settings
+    """
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files if name != "state"}
+        state = json.loads(str(data["state"]))
+    if state.pop("version", None) != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version in {path}")
+    return arrays, state
+
+
+class DiskHistory:
+    """Append-only array of float64 values, stored in a raw binary file"""
+
+    def __init__(self, path: str, chunk_size: int = 4096, append: bool = False):
+        """Create or open a history file
+
+        Parameters
+        ----------
+        path: str
+            The file of the history
+        chunk_size: int = 4096 (optional)
+            The number of values that are buffered in memory before they are written
+        append: bool = False (optional)
+            Continue an existing file, instead of starting an empty one
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self._buffer = np.empty(chunk_size, dtype=np.float64)
+        self._buffered = 0
+        self._file = open(path, "ab" if append else "wb")
+        self._written = self._file.tell() // 8
+
+    def __len__(self) -> int:
+        return self._written + self._buffered
+
+    def append(self, value: float) -> None:
+        self._buffer[self._buffered] = value
+        self._buffered += 1
+        if self._buffered == self.chunk_size:
+            self.flush()
+
+    def extend(self, values: np.ndarray) -> None:
+        self.flush()
+        self._file.write(np.asarray(values, dtype=np.float64).tobytes())
+        self._written += len(values)
+
+    def flush(self) -> None:
+        """Write the buffered values to the file"""
+
+        if self._file is None:  # closed, nothing is buffered
+            return
+        if self._buffered:
+            self._file.write(self._buffer[: self._buffered].tobytes())
+            self._written += self._buffered
+            self._buffered = 0
+        self._file.flush()
+
+    def truncate(self, length: int) -> None:
+        """Drop all values after the first length values, e.g. when resuming from a checkpoint"""
+
+        self.flush()
+        if length > self._written:
+            raise ValueError(f"History {self.path} has only {self._written} values, not {length}")
+        self._file.truncate(length * 8)
+        self._file.seek(length * 8)
+        self._written = length
+
+    def values(self) -> np.ndarray:
+        """All values, as a read-only memory map of the file"""
+
+        self.flush()
+        if not self._written:
+            return np.empty(0)
+        return np.memmap(self.path, dtype=np.float64, mode="r", shape=(self._written,))
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        values = self.values()
+        return values if dtype is None else values.astype(dtype)
+
+    def __getitem__(self, idx):
+        return self.values()[idx]
+
+    def __iter__(self):
+        return iter(self.values())
+
+    def close(self) -> None:
+        """Write the buffered values and close the file, the values can still be read"""
+
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
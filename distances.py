@@ -0,0 +1,201 @@
+"""Distance backends for the TSP object
+
+The TSP object only needs a distance "matrix" that it can index with (arrays of) pairs of
+nodes. Depending on the size of the instance this is either a dense matrix in memory, a
+matrix cached on disk which is memory-mapped, or a function that computes the distances
+on the fly. See select_backend on how one is chosen automatically.
+"""
+
+import os
+import hashlib
+import tempfile
+import typing
+
+import numpy as np
+
+
+def haversine_distances(
+    lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
+) -> np.ndarray:
+    """Vectorized version of haversine, the inputs are broadcasted against each other.
+
+    Parameters
+    ----------
+    lat1: np.ndarray
+        Latitudes for the first set of points
+    lon1: np.ndarray
+        Longtitudes for the first set of points
+    lat2: np.ndarray
+        Latitudes for the second set of points
+    lon2: np.ndarray
+        Longtitudes for the second set of points
+
+    Returns
+    -------
+        np.ndarray
+            The Haversine distances in kilometers, with the broadcasted shape of the inputs
+    """
+
+    lon1, lat1, lon2, lat2 = map(np.radians, [lon1, lat1, lon2, lat2])
+
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    r = 6371
+    return c * r
+
+
+# Every metric takes two broadcastable arrays of points, with the (lng, lat) or (x, y)
+# values in the last axis. "capitals" is the metric the original TSP object used for the
+# capitals: it passes the (lng, lat) points in the argument order of haversine.
+METRICS = {
+    "haversine": lambda a, b: haversine_distances(a[..., 1], a[..., 0], b[..., 1], b[..., 0]),
+    "capitals": lambda a, b: haversine_distances(a[..., 0], a[..., 1], b[..., 0], b[..., 1]),
+    "euclidean": lambda a, b: np.sqrt(((a - b) ** 2).sum(axis=-1)),
+}
+
+
+class DistanceFunction:
+    """Distances that are computed on the fly from the points, for instances that are too
+    large to store a distance matrix. Supports the indexing of a distance matrix."""
+
+    def __init__(self, points: np.ndarray, metric: str):
+        self.points = np.asarray(points, dtype=float)
+        self.metric = METRICS[metric]
+        self.shape = (len(self.points), len(self.points))
+
+    def __getitem__(self, key: typing.Tuple) -> np.ndarray:
+        i, j = key
+        return self.metric(self.points[i], self.points[j])
+
+    def item(self, i: int, j: int) -> float:
+        return float(self[i, j])
+
+
+def fill_matrix(points: np.ndarray, metric: str, out: np.ndarray) -> np.ndarray:
+    """Fill out with the distances between all points, a block of rows at a time so the
+    temporary arrays stay small.
+
+    Parameters
+    ----------
+    points: np.ndarray
+        Matrix of size (n, 2) of points
+    metric: str
+        One of METRICS
+    out: np.ndarray
+        Matrix of size (n, n) to store the distances in
+
+    Returns
+    -------
+        np.ndarray
+            out
+    """
+    distance = METRICS[metric]
+    chunk = max(1, 2**20 // len(points))
+    for start in range(0, len(points), chunk):
+        out[start : start + chunk] = distance(
+            points[start : start + chunk, None, :], points[None, :, :]
+        )
+    return out
+
+
+def dense_matrix(points: np.ndarray, metric: str, dtype: type = np.float32) -> np.ndarray:
+    """Distance matrix between all points, in memory"""
+
+    points = np.asarray(points, dtype=float)
+    return fill_matrix(points, metric, np.empty((len(points), len(points)), dtype=dtype))
+
+
+def cached_matrix(
+    points: np.ndarray, metric: str, cache_dir: str = None, dtype: type = np.float32
+) -> np.memmap:
+    """Distance matrix between all points, stored in a file in cache_dir which is
+    memory-mapped. The file is named after a hash of the points and the metric, so it
+    is only computed once per instance.
+
+    Parameters
+    ----------
+    points: np.ndarray
+        Matrix of size (n, 2) of points
+    metric: str
+        One of METRICS
+    cache_dir: str = None (optional)
+        Directory of the cached matrices, by default tsp_cache in the temporary directory
+    dtype: type = np.float32 (optional)
+        Type of the stored distances
+
+    Returns
+    -------
+        np.memmap
+            The read-only distance matrix
+    """
+    points = np.ascontiguousarray(points, dtype=float)
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(), "tsp_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    key = hashlib.sha1(points.tobytes())
+    key.update(f"{metric},{np.dtype(dtype).str},{points.shape}".encode())
+    path = os.path.join(cache_dir, f"{key.hexdigest()}.dist")
+    shape = (len(points), len(points))
+
+    if not os.path.exists(path):
+        # write to a temporary file first, so an interrupted run leaves no partial matrix
+        partial = f"{path}.{os.getpid()}.partial"
+        matrix = np.memmap(partial, dtype=dtype, mode="w+", shape=shape)
+        fill_matrix(points, metric, matrix)
+        matrix.flush()
+        del matrix
+        os.replace(partial, path)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def select_backend(n_points: int, memory_budget: int, disk_budget: int) -> str:
+    """Choose a distance backend for n_points points, given the number of bytes that may be
+    used for a matrix in memory and on disk.
+
+    Returns
+    -------
+        str
+            "dense" if a float32 matrix fits in the memory budget, "memmap" if it fits
+            in the disk budget, otherwise "function"
+    """
+    size = n_points**2 * np.dtype(np.float32).itemsize
+    if size <= memory_budget:
+        return "dense"
+    if size <= disk_budget:
+        return "memmap"
+    return "function"
+
+
+def dense_dtype(n_points: int, memory_budget: int) -> type:
+    """float64 if a float64 matrix of n_points points fits in the memory budget, so small
+    instances get exact distances, otherwise float32 to halve the memory"""
+
+    if n_points**2 * np.dtype(np.float64).itemsize <= memory_budget:
+        return np.float64
+    return np.float32
+
+
+def make_distances(
+    points: np.ndarray,
+    metric: str,
+    backend: str = "auto",
+    memory_budget: int = 2**30,
+    disk_budget: int = 2**34,
+    cache_dir: str = None,
+):
+    """Create the distances between all points with the given backend, see select_backend
+    for backend="auto". A dense matrix is float64 when that fits memory_budget, see
+    dense_dtype."""
+
+    if backend == "auto":
+        backend = select_backend(len(points), memory_budget, disk_budget)
+    if backend == "dense":
+        return dense_matrix(points, metric, dense_dtype(len(points), memory_budget))
+    if backend == "memmap":
+        return cached_matrix(points, metric, cache_dir)
+    if backend == "function":
+        return DistanceFunction(points, metric)
+    raise ValueError(f"Unknown distance backend {backend}")
@@ -1,49 +1,110 @@
+import os
+import multiprocessing
+
 from randomSearch import RandomSearch as RS
 from ga import GeneticAlgorithm as GA
-import matplotlib.pyplot as plt
 import numpy as np
-from scipy.signal import savgol_filter
-
-def make_convergence_plots(upper_limit, repetitions=6, smoothing_window=15):
-#     """Makes the plot with the conversion curves"""
-    print("Starting Random Search Experiment...")
-    average_history = np.zeros(upper_limit)
-    for repetition in range(repetitions):
-        print(f"repetion={repetition}")
-        random_search = RS(upper_limit, plot=False)
-        random_search()
-        average_history += (random_search.convergence_history - average_history)/(repetition+1)
-    plt.plot(savgol_filter(average_history, smoothing_window, 1), label='Random Search')
-
-    nPaths = 30
-    survivalRate=65
+
+ALGORITHMS = {"rs": RS, "ga": GA}
+
+
+def make_configs(upper_limit, nPaths=30, survivalRate=65):
+    """Makes the configurations compared in the convergence plots, all with a budget of about upper_limit operations.
+
+    Every configuration is a dict with a unique name, a label for the plot, the algorithm ("rs" or "ga"),
+    the keyword arguments for the algorithm and the number of operations per step of its history.
+    """
     changesPerEpoch = int(np.ceil((nPaths*(1-survivalRate/100))))
-    print("\n\nStarting Genetic Algorithm with Swap Operator Experiment...")
-    mutationOperator="swap"
-    average_history = np.zeros(int(np.ceil(upper_limit/changesPerEpoch))+1)
-    for repetition in range(repetitions):
-        print(f"repetion={repetition}")
-        genetic_algorithm = GA(nPaths = nPaths, survivalRate=survivalRate, endParameterMax=np.ceil(upper_limit/changesPerEpoch))
-        genetic_algorithm()
-        average_history += (genetic_algorithm.history - average_history)/(repetition+1)
-    plt.plot(range(0,len(average_history)*changesPerEpoch,changesPerEpoch), savgol_filter(average_history, smoothing_window, 1), label={"Genetic Algorithm w/ swap"})
-
-    print("\n\nStarting Genetic Algorithm with Inversion Operator Experiment...")
-    mutationOperator="inversion"
-    average_history = np.zeros(int(np.ceil(upper_limit/changesPerEpoch))+1)
-    for repetition in range(repetitions):
-        print(f"repetion={repetition}")
-        genetic_algorithm = GA(nPaths = nPaths, survivalRate=survivalRate, endParameterMax=np.ceil(upper_limit/changesPerEpoch))
-        genetic_algorithm()
-        average_history += (genetic_algorithm.history - average_history)/(repetition+1)
-    plt.plot(range(0,len(average_history)*changesPerEpoch,changesPerEpoch), savgol_filter(average_history, smoothing_window, 1), label={"Genetic Algorithm w/ inversion"})
+    epochs = int(np.ceil(upper_limit/changesPerEpoch))
+    configs = [{"name": "random_search", "label": "Random Search", "algorithm": "rs", "kwargs": {"upper_limit": upper_limit}, "xInterval": 1}]
+    for mutationOperator in ("swap", "inversion"):
+        configs.append({
+            "name": f"ga_{mutationOperator}",
+            "label": f"Genetic Algorithm w/ {mutationOperator}",
+            "algorithm": "ga",
+            "kwargs": {"nPaths": nPaths, "survivalRate": survivalRate, "endParameterMax": epochs, "mutationOperator": mutationOperator, "verbose": False},
+            "xInterval": changesPerEpoch,
+        })
+    return configs
+
+
+def config_label(config):
+    return config.get("label", config["name"])
+
+
+def _run_task(task):
+    """Runs one repetition of one configuration in a worker process, returns its convergence history."""
+    configIdx, repetition, algorithm, kwargs, seed = task
+    search = ALGORITHMS[algorithm](rng=np.random.default_rng(seed), **kwargs)
+    search()
+    history = search.convergence_history if algorithm == "rs" else search.history
+    return configIdx, repetition, np.asarray(history, dtype=float)
+
+
+def run_experiments(configs, repetitions=6, seed=0, processes=None, output="convergence.npz"):
+    """Runs every configuration repetitions times on a process pool and collects the convergence histories.
+
+    Every run gets its own np.random.Generator, spawned from seed, so the results only depend on the seed and
+    not on the number of processes or the order in which the runs finish.
+
+    parameters:
+        configs (list): the configurations to run, see make_configs.
+        repetitions (int): the number of runs per configuration.
+        seed (int): the master seed for all runs.
+        processes (int): the size of the process pool, the number of cpus by default.
+        output (str): path of the compressed .npz file the histories are saved to, None to not save them.
+
+    returns:
+        dict: a (repetitions, steps) array of convergence histories per configuration name. Runs that stopped
+        early are padded with their final best distance.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(len(configs) * repetitions)
+    tasks = [
+        (configIdx, repetition, config["algorithm"], config["kwargs"], seeds[configIdx * repetitions + repetition])
+        for configIdx, config in enumerate(configs)
+        for repetition in range(repetitions)
+    ]
+    histories = [None] * len(configs)
+    processes = min(processes or os.cpu_count(), len(tasks))
+    with multiprocessing.Pool(processes) as pool:
+        for configIdx, repetition, history in pool.imap_unordered(_run_task, tasks):
+            if histories[configIdx] is None:
+                histories[configIdx] = np.full((repetitions, len(history)), np.nan)
+            elif len(history) > histories[configIdx].shape[1]:
+                histories[configIdx] = np.pad(histories[configIdx], ((0, 0), (0, len(history) - histories[configIdx].shape[1])), mode="edge")
+            histories[configIdx][repetition, :len(history)] = history
+            histories[configIdx][repetition, len(history):] = history[-1]
+            print(f"finished {config_label(configs[configIdx])} repetion={repetition}")
+    histories = {config["name"]: history for config, history in zip(configs, histories)}
+    if output is not None:
+        np.savez_compressed(output, seed=seed, **histories)
+    return histories
+
+
+def plot_convergence(configs, histories, smoothing_window=15):
+    """Plots the average convergence history per configuration, histories can be the result of run_experiments
+    or the loaded .npz file."""
+    import matplotlib.pyplot as plt
+    from scipy.signal import savgol_filter
+
+    for config in configs:
+        average_history = np.mean(histories[config["name"]], axis=0)
+        xInterval = config["xInterval"]
+        plt.plot(range(0, len(average_history)*xInterval, xInterval), savgol_filter(average_history, smoothing_window, 1), label=config_label(config))
     plt.legend()
     plt.xlabel("number of operations")
     plt.ylabel("distance of the best path")
     plt.title("Conversion Plots")
     plt.show()
 
+
+def make_convergence_plots(upper_limit, repetitions=6, smoothing_window=15, seed=0, processes=None, output="convergence.npz"):
+    """Makes the plot with the conversion curves"""
+    configs = make_configs(upper_limit)
+    histories = run_experiments(configs, repetitions, seed=seed, processes=processes, output=output)
+    plot_convergence(configs, histories, smoothing_window)
+
 if __name__ == "__main__":
     # Run Random Search Experiment
-    upper_limit = 15000 # set equal to max_unchanged_iterations for GA for fair assessment 
+    upper_limit = 15000 # set equal to max_unchanged_iterations for GA for fair assessment
     make_convergence_plots(upper_limit)
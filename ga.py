@@ -1,43 +1,154 @@
 from tsp import * 
+import time
 import numpy as np
-import matplotlib.pyplot as plt
+from localsearch import LocalSearch
+from instrumentation import Stats, population_diversity
+from checkpoint import DiskHistory, load_checkpoint, save_checkpoint
+
+# below this number of cities in all mutated paths together, rescoring the mutated paths with TSP.evaluate_batch is
+# faster than TSP.delta_batch, which has a fixed cost of about 100-250 us (measured with benchmarks.py, e.g. 30 paths
+# of the 44 capitals take 31 us to rescore and 115-197 us to delta evaluate, at 30 paths of 300 cities both take ~110 us).
+DELTA_MIN_SIZE = 8192
+
+class Population:
+    def __init__(self, nPaths, dim):
+        """fixed size population of paths/individuals/chromosomes together with their distances.
+
+        parameters:
+            nPaths (int): the number of paths in the population.
+            dim (int): the number of cities in a path.
+        """
+        dtype = np.int16 if dim <= np.iinfo(np.int16).max else np.int32
+        self.paths = np.empty((nPaths, dim), dtype=dtype)
+        self.distances = np.full(nPaths, np.inf)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def select(self, nSurvivors):
+        """move the nSurvivors shortest paths to the front of the population, in arbitrary order.
+
+        parameters:
+            nSurvivors (int): the number of paths that survive.
+        """
+        survivors = np.argpartition(self.distances, nSurvivors - 1)[:nSurvivors]
+        self.paths[:nSurvivors] = self.paths[survivors]
+        self.distances[:nSurvivors] = self.distances[survivors]
+
+    def replaceWorst(self, paths, distances):
+        """replace the longest paths of the population by the given paths, e.g. migrants from another population.
+
+        parameters:
+            paths (np.ndarray): the new paths, one per row.
+            distances (np.ndarray): the distances of the new paths.
+        """
+        worst = np.argpartition(-self.distances, len(paths) - 1)[:len(paths)]
+        self.paths[worst] = paths
+        self.distances[worst] = distances
+
+    def best(self):
+        """returns:
+            tuple: a copy of the shortest path and its distance.
+        """
+        idx = np.argmin(self.distances)
+        return self.paths[idx].copy(), self.distances[idx]
+
 
 class GeneticAlgorithm:
-    def __init__(self, nPaths=30, survivalRate=65, mutationRate=20, endParameter="epoch", endParameterMax=2000, mutationOperator="inversion"):
+    def __init__(self, nPaths=30, survivalRate=65, mutationRate=20, endParameter="epoch", endParameterMax=2000, mutationOperator="inversion", rng=None, verbose=True,
+                 localSearch=None, localSearchMoves=None, localSearchTime=None, localSearchNeighbors=8, seeding=(), stats=None,
+                 checkpointFile=None, checkpointInterval=100, historyFile=None, targetGap=None, lowerBound=None,
+                 maxTime=None, maxEvaluations=None):
+        """create a genetic algorithm for the tsp.
+
+        parameters:
+            nPaths (int): the number of paths in the population.
+            survivalRate (int): the percentage of paths that survive to the next generation.
+            mutationRate (int): the percentage of paths that are mutated in the next generation, the rest are crossovers.
+            endParameter (str): "epoch" to stop after endParameterMax epochs, otherwise after endParameterMax epochs without improvement.
+            endParameterMax (int): see endParameter.
+            mutationOperator (str): "inversion" or "swap".
+            rng (np.random.Generator): the source of all random choices, a fresh unseeded one by default.
+            verbose (bool): whether to print the progress.
+            localSearch (str): improve paths every generation with 2-opt and or-opt (see LocalSearch), either the new
+                "offspring", the surviving "elite" or only the "best" path. None to disable.
+            localSearchMoves (int): the maximum number of local search moves per generation, unlimited by default.
+            localSearchTime (float): the maximum number of seconds spent on local search per generation, unlimited by default.
+            localSearchNeighbors (int): the number of candidate neighbours per city in the local search.
+            seeding (tuple): tour constructions ("nearest", "greedy" and/or "spacefilling", see SpatialIndex) that replace
+                random paths in the initial population, the rest of the population stays random.
+            stats (Stats): collects per-phase timings and counters of the run, disabled by default.
+            checkpointFile (str): file to which a checkpoint is written every checkpointInterval epochs, see resume.
+            checkpointInterval (int): the number of epochs between checkpoints.
+            historyFile (str): file to which the history is streamed (see DiskHistory), instead of keeping it in memory.
+            targetGap (float): stop as soon as the best path is at most this fraction longer than lowerBound, e.g. 0.01.
+            lowerBound (float): lower bound on the length of the shortest path, computed with bounds.lower_bound at the start of
+                the run by default. that costs about iterations * n**2 distance lookups (seconds at 1000 cities, minutes at
+                several thousand), so pass a precomputed bound for large instances. the bound is kept in checkpoints.
+            maxTime (float): stop after this many seconds, checked after every generation. unlimited by default.
+            maxEvaluations (int): stop after this many tour evaluations since the start of the run (see TSP.evaluations, paths
+                scored by their delta (see DELTA_MIN_SIZE) and lengths taken from the tsp cache do not count), checked after
+                every generation. unlimited by default.
+        """
         self.nPaths = nPaths
         self.survivalRate = survivalRate
         self.mutationRate = mutationRate
         self.crossoverRate = 100 - (survivalRate + mutationRate)
+        self.mutationName = "inversion" if mutationOperator == "inversion" else "swap"
         self.mutationOperator = self.inversionOperator if mutationOperator == "inversion" else self.swapOperator
-        self.end = lambda: (self.epoch >= endParameterMax) if endParameter == "epoch" else  (lambda: self.unchangedIterations >= endParameterMax)  
+        self.mutationBatch = self.inversionBatch if mutationOperator == "inversion" else self.swapBatch
+        self.end = (lambda: self.epoch >= endParameterMax) if endParameter == "epoch" else (lambda: self.unchangedIterations >= endParameterMax)
+        self.rng = np.random.default_rng() if rng is None else rng  # np.random.Generator used for all random choices
+        self.verbose = verbose
+        self.localSearch = localSearch
+        self.localSearchMoves = localSearchMoves
+        self.localSearchTime = localSearchTime
+        self.localSearchNeighbors = localSearchNeighbors
+        self.seeding = seeding
+        self.stats = Stats(enabled=False) if stats is None else stats
+        self.checkpointFile = checkpointFile
+        self.checkpointInterval = checkpointInterval
+        self.historyFile = historyFile
+        self.targetGap = targetGap
+        self.lowerBound = lowerBound
+        self.maxTime = maxTime
+        self.maxEvaluations = maxEvaluations
         self.epoch = 0
+        self.evaluations = 0  # tour evaluations since the start of the run
+        self.startEvaluations = 0  # tsp.evaluations at the start of the run
         self.unchangedIterations = 0
 
     @staticmethod
-    def swapOperator(path):
+    def swapOperator(path, rng=None):
         """swap two random genes in the given path/individual/chromosome.
 
         parameters:
             path (np.ndarray): one solution to the problem.
+            rng (np.random.Generator): the source of the random genes, a fresh unseeded one by default.
 
         returns:
             np.ndarray: the mutated path, with two genes swapped.
+            tuple: the applied move ("swap", i, j), see TSP.delta.
         """
-        mutation = np.random.choice(len(path), 2, replace=False)  # choosing two random gene indexes
+        rng = np.random.default_rng() if rng is None else rng
+        mutation = rng.choice(len(path), 2, replace=False)  # choosing two random gene indexes
         path[mutation[0]], path[mutation[1]] = path[mutation[1]], path[mutation[0]]  # swapping
-        return path
+        return path, ("swap", mutation[0], mutation[1])
 
     @staticmethod
-    def inversionOperator(path):
+    def inversionOperator(path, rng=None):
         """inverse a random segment of the path/individual/chromosome.
 
         parameters:
             path (np.ndarray): one solution to the problem.
+            rng (np.random.Generator): the source of the random segment, a fresh unseeded one by default.
 
         returns:
             np.ndarray: the mutated path, with a random segment inverted.
+            tuple: the applied move ("inversion", i, j), see TSP.delta.
         """
-        mutation = np.random.choice(len(path), 2, replace=False) 
+        rng = np.random.default_rng() if rng is None else rng
+        mutation = rng.choice(len(path), 2, replace=False)
         if mutation[0] > mutation[1]:  # outsides of path being inversed 
             righthalf = np.arange(mutation[0], len(path))  # creates array of numbers for remaining right half of array
             lefthalf = np.arange(0, mutation[1] + 1)  # same for the left half up to lower index chosen
@@ -45,79 +156,382 @@ class GeneticAlgorithm:
         else:  # inside of path being inversed
             mutationidxs = np.arange(mutation[0], mutation[1])
         path[mutationidxs] = path[mutationidxs[::-1]] 
-        return path
+        return path, ("inversion", mutation[0], mutation[1])
 
     @staticmethod
-    def crossoverOperator(path0, path1):
+    def swapBatch(paths, mutations):
+        """swap two genes in every path of a block of paths/individuals/chromosomes at once.
+
+        parameters:
+            paths (np.ndarray): the parent paths, one per row.
+            mutations (np.ndarray): two distinct gene indexes per row, the genes to swap.
+
+        returns:
+            np.ndarray: the mutated copies of the paths.
+        """
+        rows = np.arange(len(paths))
+        children = paths.copy()
+        children[rows, mutations[:, 0]] = paths[rows, mutations[:, 1]]
+        children[rows, mutations[:, 1]] = paths[rows, mutations[:, 0]]
+        return children
+
+    @staticmethod
+    def inversionBatch(paths, mutations):
+        """inverse a segment of every path of a block of paths/individuals/chromosomes at once,
+        segments are chosen the same way as in inversionOperator, including the outsides.
+
+        parameters:
+            paths (np.ndarray): the parent paths, one per row.
+            mutations (np.ndarray): two distinct gene indexes per row, the ends of the segment.
+
+        returns:
+            np.ndarray: the mutated copies of the paths.
+        """
+        dim = paths.shape[1]
+        start, end = mutations[:, :1], mutations[:, 1:]
+        length = np.where(start < end, end - start, end - start + dim + 1)  # segment length, wrapping around the end
+        offset = (np.arange(dim) - start) % dim  # position of every gene counted from the start of the segment
+        source = np.where(offset < length, (start + length - 1 - offset) % dim, np.arange(dim))
+        return np.take_along_axis(paths, source, axis=1)
+
+    @staticmethod
+    def crossoverOperator(path0, path1, rng=None):
         """perform crossover between two paths/individuals/chromosomes.
 
         parameters:
             path0 (np.ndarray): the first parent path.
             path1 (np.ndarray): the second parent path.
+            rng (np.random.Generator): the source of the crossover string, a fresh unseeded one by default.
 
         returns:
             np.ndarray: the mutated path resulting from the crossover operation.
         """
-        start = np.random.choice(len(path0))
-        end = np.random.choice(range(start, len(path0) + 1))
+        rng = np.random.default_rng() if rng is None else rng
+        start = rng.integers(len(path0))
+        end = rng.integers(start, len(path0) + 1)
         crossoverstring = path0[start:end] 
         path1 = path1[np.isin(path1, crossoverstring, invert=True)]
         path1 = np.insert(path1, start, crossoverstring)
         return path1
 
-    def __call__(self):
+    @staticmethod
+    def crossoverBatch(paths0, paths1, starts, ends):
+        """perform crossover between many pairs of paths/individuals/chromosomes at once, every
+        child is built exactly as in crossoverOperator, using the given crossover strings.
+
+        parameters:
+            paths0 (np.ndarray): the first parent of every pair, one per row.
+            paths1 (np.ndarray): the second parent of every pair, one per row.
+            starts (np.ndarray): the start of the crossover string of every pair.
+            ends (np.ndarray): the (exclusive) end of the crossover string of every pair.
+
+        returns:
+            np.ndarray: the children resulting from the crossover operations, one per row.
+        """
+        rows = np.arange(len(paths0))[:, None]
+        genes = np.arange(paths0.shape[1])
+        start, end = starts[:, None], ends[:, None]
+        # rank of every city in the first parent, used to find the genes of the second parent outside of the crossover string
+        ranks0 = np.empty_like(paths0)
+        ranks0[rows, paths0] = genes
+        ranks1 = ranks0[rows, paths1]
+        outside = (ranks1 < start) | (ranks1 >= end)
+        remaining = np.take_along_axis(paths1, np.argsort(~outside, axis=1, kind="stable"), axis=1)  # outside genes first, in order
+        source = np.where(genes < start, genes, genes - (end - start))
+        source = np.clip(source, 0, paths0.shape[1] - 1)
+        return np.where((genes >= start) & (genes < end), paths0, np.take_along_axis(remaining, source, axis=1))
+
+    def __call__(self, tsp=None, resume=None):
         """execute a genetic algorithm to optimize the tsp solution.
 
         parameters:
-            npaths (int): the number of paths in the population.
-            maxunchangediterations (int): the maximum number of iterations without improvement.
-            survivalrate (int): the percentage of paths that survive to the next generation.
-            mutationrate (int): the percentage of paths that are mutated in the next generation.
-            mutationoperator (function): the function used to perform mutations on paths.
+            tsp (TSP): the problem to optimize, the european capitals by default.
+            resume (str): checkpoint file to continue from, instead of starting with a random population.
 
         returns:
-            none: this function does not return a value but prints results and plots the best route found.
+            none: this function does not return a value but prints results and stores the best route found in bestRoute and bestDistance.
+        """
+        for _ in self.run_iter(tsp, resume):
+            pass
+
+    def run_iter(self, tsp=None, resume=None):
+        """execute the genetic algorithm as a generator, that yields the best path so far after the initialization and after
+        every generation. the run can be stopped at any moment by no longer iterating, bestRoute and bestDistance are
+        then set once the generator is closed.
+
+        parameters:
+            tsp (TSP): the problem to optimize, the european capitals by default.
+            resume (str): checkpoint file to continue from, instead of starting with a random population.
+
+        yields:
+            tuple: a copy of the best path, its distance, the number of epochs and the number of tour evaluations since the
+                start of the run, see maxEvaluations.
+        """
+        self.startTime = time.perf_counter()
+        tsp = TSP() if tsp is None else tsp
+        if resume is None:
+            self.initialize(tsp)
+        else:
+            self.resume(resume, tsp)
+        try:
+            while True:
+                yield (*self.population.best(), self.epoch, self.evaluations)
+                if self.stopped():
+                    break
+                self.step()
+        finally:
+            self.bestRoute, self.bestDistance = self.population.best()
+            if isinstance(self.history, DiskHistory):
+                self.history.close()
+
+    def stopped(self):
+        """returns:
+            bool: whether one of the stopping criteria is met: endParameter, targetGap, maxTime or maxEvaluations.
+        """
+        return (self.end() or self.converged()
+                or (self.maxTime is not None and time.perf_counter() - self.startTime >= self.maxTime)
+                or (self.maxEvaluations is not None and self.evaluations >= self.maxEvaluations))
+
+    def initialize(self, tsp):
+        """create a random population for the given tsp, the first step of __call__.
+
+        parameters:
+            tsp (TSP): the problem to optimize.
         """
-        tsp = TSP()
-        paths = np.array([np.random.permutation(tsp.dim) for _ in range(self.nPaths)])
-        distances = np.array([tsp(path) for path in paths])
-        self.history = []
-        self.minDist = np.min(distances)
+        self.tsp = tsp
+        self.stats.reset()
+        self.population = Population(self.nPaths, tsp.dim)
+        self.population.paths[:] = self.rng.permuted(np.tile(np.arange(tsp.dim), (self.nPaths, 1)), axis=1)
+        if self.seeding:
+            from spatial import SpatialIndex  # scipy is only imported when seeding is used
+            index = SpatialIndex(tsp)
+            for idx, method in enumerate(self.seeding[:self.nPaths]):
+                self.population.paths[idx] = index.tour(method)
+        self.startEvaluations = tsp.evaluations
+        self.population.distances[:] = tsp.evaluate_batch(self.population.paths)
+        self.epoch = 0
+        self.unchangedIterations = 0
+        self.evaluations = tsp.evaluations - self.startEvaluations
+        self.setup()
+        self.closeHistory()
+        self.history = [] if self.historyFile is None else DiskHistory(self.historyFile)
+        self.minDist = np.min(self.population.distances)
         self.history.append(self.minDist)
-        print(f"initial smallest distance = {self.minDist}\ninitiating genetic algorithm\n")
-        while not self.end():
-            # best % survives, unique produces the indexes of distances that produce the sorting of unique items, used to choose the surviving paths
-            _, sortingidxs = np.unique(distances, return_index=True)
-            paths = paths[sortingidxs][:self.nPaths * self.survivalRate // 100]
-            # teenage turtles
-            while len(paths) < self.nPaths * (self.survivalRate + self.mutationRate) / 100:
-                idx = np.random.choice(len(paths))
-                mutatedpath = self.mutationOperator(paths[idx].copy())
-                paths = np.append(paths, [mutatedpath], axis=0)
-            # perform crossovers in the original surviving paths
-            crossovers = [np.random.choice(self.nPaths * self.survivalRate // 100, 2, replace=False) for _ in range(self.nPaths * self.crossoverRate // 100)]
-            for crossover in crossovers:
-                crossoveredpath = self.crossoverOperator(paths[crossover[0]].copy(), paths[crossover[1]].copy())
-                paths = np.append(paths, [crossoveredpath], axis=0)
-            # calculate new distances and keep track if improvements are being made
-            distances = np.array([tsp(path) for path in paths])
-            newMin = np.min(distances)
-            if newMin < self.minDist:
-                self.mindist = newMin
-                self.unchangedIterations = 0
+        if self.verbose:
+            print(f"initial smallest distance = {self.minDist}\ninitiating genetic algorithm\n")
+
+    def closeHistory(self):
+        """close the file of the history of a previous run, if it was streamed to disk."""
+        if isinstance(getattr(self, "history", None), DiskHistory):
+            self.history.close()
+
+    def setup(self):
+        """derive the sizes of the next generations and the local search from the parameters, for initialize and resume."""
+        self.nSurvivors = self.nPaths * self.survivalRate // 100
+        self.nMutated = int(np.ceil(self.nPaths * (self.survivalRate + self.mutationRate) / 100)) - self.nSurvivors
+        nCrossovers = self.nPaths - self.nSurvivors - self.nMutated
+        if self.tsp.dim < 2:
+            raise ValueError(f"the tsp needs at least 2 cities to mutate and cross paths, not {self.tsp.dim}")
+        if self.nMutated > 0 and self.nSurvivors < 1:
+            raise ValueError(f"{self.nPaths} paths with survivalRate {self.survivalRate} leave no survivor to mutate")
+        if nCrossovers > 0 and self.nSurvivors < 2:
+            raise ValueError(f"{self.nPaths} paths with survivalRate {self.survivalRate} leave {self.nSurvivors} survivor(s), "
+                             "crossovers need at least 2 distinct parents")
+        if self.localSearch is not None:
+            self.localSearcher = LocalSearch(self.tsp, self.localSearchNeighbors)
+        if self.targetGap is not None and self.lowerBound is None:
+            from bounds import lower_bound
+            self.lowerBound = lower_bound(self.tsp)
+
+    def gap(self):
+        """returns:
+            float: the fraction by which the best path is longer than lowerBound, an upper bound on its distance to the optimum.
+        """
+        return (np.min(self.population.distances) - self.lowerBound) / self.lowerBound
+
+    def converged(self):
+        """returns:
+            bool: whether the best path is within targetGap of the optimum.
+        """
+        return self.targetGap is not None and self.gap() <= self.targetGap
+
+    def checkpoint(self, path=None):
+        """write the population, the rng state and the counters to a checkpoint file, see resume.
+
+        parameters:
+            path (str): the file to write, checkpointFile by default.
+        """
+        if isinstance(self.history, DiskHistory):
+            self.history.flush()  # the file has to hold at least the history up to the checkpoint
+            arrays = {}
+        else:
+            arrays = {"history": np.asarray(self.history, dtype=float)}
+        state = {
+            "nPaths": self.nPaths,
+            "dim": self.tsp.dim,
+            "survivalRate": self.survivalRate,
+            "mutationRate": self.mutationRate,
+            "mutationOperator": self.mutationName,
+            "epoch": self.epoch,
+            "unchangedIterations": self.unchangedIterations,
+            "startEvaluations": self.startEvaluations,
+            "minDist": float(self.minDist),
+            "evaluations": self.tsp.evaluations,
+            "historyLength": len(self.history),
+            "historyFile": self.historyFile,
+            "lowerBound": self.lowerBound,
+            "rng": self.rng.bit_generator.state,
+        }
+        save_checkpoint(self.checkpointFile if path is None else path,
+                        dict(arrays, paths=self.population.paths, distances=self.population.distances), state)
+
+    def resume(self, path, tsp):
+        """continue from a checkpoint instead of initialize, the run then continues exactly as the checkpointed run would have.
+        the algorithm has to be created with the same parameters as the checkpointed one.
+
+        parameters:
+            path (str): the checkpoint file, written by checkpoint.
+            tsp (TSP): the problem of the checkpointed run.
+        """
+        arrays, state = load_checkpoint(path)
+        expected = {"nPaths": self.nPaths, "dim": tsp.dim, "survivalRate": self.survivalRate,
+                    "mutationRate": self.mutationRate, "mutationOperator": self.mutationName}
+        for key, value in expected.items():
+            if state[key] != value:
+                raise ValueError(f"checkpoint {path} has {key} {state[key]}, not {value}")
+        if state["rng"]["bit_generator"] != type(self.rng.bit_generator).__name__:
+            raise ValueError(f"checkpoint {path} uses a {state['rng']['bit_generator']} random number generator")
+        self.tsp = tsp
+        self.stats.reset()
+        self.population = Population(self.nPaths, tsp.dim)
+        self.population.paths[:] = arrays["paths"]
+        self.population.distances[:] = arrays["distances"]
+        if self.lowerBound is None:
+            self.lowerBound = state.get("lowerBound")  # setup only computes the bound if it was not checkpointed
+        self.setup()
+        self.closeHistory()
+        if self.historyFile is None:
+            history = arrays["history"] if "history" in arrays else np.fromfile(state["historyFile"], count=state["historyLength"])
+            self.history = history.tolist()
+        elif "history" in arrays:
+            self.history = DiskHistory(self.historyFile)
+            self.history.extend(arrays["history"])
+        else:
+            self.history = DiskHistory(self.historyFile, append=True)
+            self.history.truncate(state["historyLength"])  # drop the epochs after the checkpoint, they are repeated
+        self.rng.bit_generator.state = state["rng"]
+        self.epoch = state["epoch"]
+        self.unchangedIterations = state["unchangedIterations"]
+        self.minDist = state["minDist"]
+        # continue counting the evaluations of the run on top of the current count of the tsp
+        self.evaluations = state["evaluations"] - state["startEvaluations"]
+        self.startEvaluations = tsp.evaluations - self.evaluations
+        if self.verbose:
+            print(f"resuming genetic algorithm at epoch {self.epoch}, smallest distance = {np.min(self.population.distances)}\n")
+
+    def draw(self, nMutated, nCrossovers):
+        """draw all random choices of one generation from a single block of uniform numbers of rng.
+
+        parameters:
+            nMutated (int): the number of mutated paths.
+            nCrossovers (int): the number of crossover children.
+
+        returns:
+            np.ndarray: the parent of every mutated path, among the survivors.
+            np.ndarray: two distinct gene indexes per mutated path, see swapBatch and inversionBatch.
+            np.ndarray: two distinct parents per crossover child, among the survivors.
+            np.ndarray: the start of the crossover string of every child.
+            np.ndarray: the (exclusive) end of the crossover string of every child, see crossoverBatch.
+        """
+        dim, nSurvivors = self.tsp.dim, self.nSurvivors
+        uniform = self.rng.random(3 * nMutated + 4 * nCrossovers)
+        u = uniform[:3 * nMutated].reshape(nMutated, 3)
+        v = uniform[3 * nMutated:].reshape(nCrossovers, 4)
+
+        def below(u, n):
+            """integers from 0 up to n, uniform numbers times n are rounded up to n in rare cases"""
+            return np.minimum((u * n).astype(np.intp), n - 1)
+
+        parents = below(u[:, 0], nSurvivors)
+        mutations = np.column_stack([below(u[:, 1], dim), below(u[:, 2], dim - 1)])
+        mutations[:, 1] += mutations[:, 1] >= mutations[:, 0]  # two distinct genes per path
+        crossovers = np.column_stack([below(v[:, 0], nSurvivors), below(v[:, 1], nSurvivors - 1)])
+        crossovers[:, 1] += crossovers[:, 1] >= crossovers[:, 0]  # two distinct parents per child
+        starts = below(v[:, 2], dim)
+        ends = starts + below(v[:, 3], dim + 1 - starts)
+        return parents, mutations, crossovers, starts, ends
+
+    def step(self):
+        """perform one generation/epoch of the genetic algorithm on the population made by initialize."""
+        tsp, nSurvivors, nMutated, stats = self.tsp, self.nSurvivors, self.nMutated, self.stats
+        # best % survives and is moved to the front, the rest of the population gets replaced
+        with stats.phase("selection"):
+            self.population.select(nSurvivors)
+        paths, distances = self.population.paths, self.population.distances
+        nCrossovers = self.nPaths - nSurvivors - nMutated
+        with stats.phase("random"):
+            parents, mutations, crossovers, starts, ends = self.draw(nMutated, nCrossovers)
+        # teenage turtles, their distance follows from the parent and the applied move
+        with stats.phase("mutation"):
+            paths[nSurvivors:nSurvivors + nMutated] = self.mutationBatch(paths[parents], mutations)
+        with stats.phase("delta"):
+            if nMutated * (tsp.dim + 1) >= DELTA_MIN_SIZE:
+                distances[nSurvivors:nSurvivors + nMutated] = distances[parents] + tsp.delta_batch(paths[parents], self.mutationName, mutations)
             else:
-                self.unchangedIterations += 1
-            # print status once every 50 epochs and update epoch
-            if (not self.epoch % 50):
-                print(f'epoch {self.epoch}...')
-                print(f'smallest distance = {newMin}')
-            self.epoch += 1
-            self.history.append(newMin)
-        self.bestRoute = paths[np.argmin(distances)]
-        self.bestDistance = np.min(distances)
+                distances[nSurvivors:nSurvivors + nMutated] = tsp.evaluate_batch(paths[nSurvivors:nSurvivors + nMutated])
+        # perform crossovers in the original surviving paths
+        with stats.phase("crossover"):
+            paths[nSurvivors + nMutated:] = self.crossoverBatch(paths[crossovers[:, 0]], paths[crossovers[:, 1]], starts, ends)
+        # calculate distances of the crossovers and keep track if improvements are being made
+        with stats.phase("evaluation"):
+            distances[nSurvivors + nMutated:] = tsp.evaluate_batch(paths[nSurvivors + nMutated:])
+        if self.localSearch is not None:
+            with stats.phase("localSearch"):
+                self.improve()
+        newMin = np.min(distances)
+        if newMin < self.minDist:
+            self.minDist = newMin
+            self.unchangedIterations = 0
+        else:
+            self.unchangedIterations += 1
+        # print status once every 50 epochs and update epoch
+        if self.verbose and (not self.epoch % 50):
+            print(f'epoch {self.epoch}...')
+            print(f'smallest distance = {newMin}')
+        self.epoch += 1
+        self.evaluations = tsp.evaluations - self.startEvaluations
+        self.history.append(newMin)
+        if stats.enabled:
+            stats.record(self.epoch, self.evaluations, newMin, population_diversity(paths, tsp.depot))
+        if self.checkpointFile is not None and not self.epoch % self.checkpointInterval:
+            self.checkpoint()
+
+    def improve(self):
+        """apply the local search to the paths selected by localSearch, within the budget of one generation.
+        the distances are updated with the change in length found by the local search, without re-evaluating the paths."""
+        paths, distances = self.population.paths, self.population.distances
+        if self.localSearch == "offspring":
+            selected = range(self.nSurvivors, self.nPaths)
+        elif self.localSearch == "elite":
+            selected = range(self.nSurvivors)
+        elif self.localSearch == "best":
+            selected = [np.argmin(distances)]
+        else:
+            raise ValueError(f"unknown localSearch {self.localSearch}")
+        deadline = None if self.localSearchTime is None else time.perf_counter() + self.localSearchTime
+        movesLeft = self.localSearchMoves
+        for idx in selected:
+            if (movesLeft is not None and movesLeft <= 0) or (deadline is not None and time.perf_counter() >= deadline):
+                break
+            paths[idx], delta, moves = self.localSearcher(paths[idx], movesLeft, deadline)
+            distances[idx] += delta
+            if movesLeft is not None:
+                movesLeft -= moves
+
     def plotPath(self):
         with TSP(plot=True) as tsp:
             tsp.plot_route(self.bestRoute, self.bestDistance)
     def plotConvergence(self, label='', xInterval=1):
-        plt.plot(range(0, len(self.history)*xInterval, xInterval), self.history, label=label)
+        import matplotlib.pyplot as plt
+        plt.plot(range(0, len(self.history)*xInterval, xInterval), np.asarray(self.history), label=label)
 
@@ -0,0 +1,169 @@
+"""Instrumentation for the search algorithms
+
+A Stats object collects per-phase timings, evaluation counts, the best distance and the
+population diversity of a run. The algorithms always call into it, but a disabled Stats
+object (the default) returns before doing any work, so the overhead is negligible.
+"""
+
+import collections
+import contextlib
+import json
+import time
+import typing
+
+import numpy as np
+
+_NO_TIMER = contextlib.nullcontext()
+
+
+class _PhaseTimer:
+    """Context manager that adds the elapsed time to a phase of a Stats object"""
+
+    __slots__ = ("stats", "name", "start")
+
+    def __init__(self, stats: "Stats", name: str):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.stats.phase_times[self.name] += time.perf_counter() - self.start
+
+
+def population_diversity(paths: np.ndarray, depot: int) -> float:
+    """The number of distinct edges in a population, divided by the number of edges in a
+    tour. This is 1 when all tours are the same (in either direction) and grows up to the
+    number of tours when they share no edges.
+
+    Parameters
+    ----------
+    paths: np.ndarray[int]
+        Matrix of size (n_tours, n) with a tour per row
+    depot: int
+        Node of the depot, which starts and ends every tour
+
+    Returns
+    -------
+        float
+    """
+    n_tours, dim = paths.shape
+    padded = np.empty((n_tours, dim + 2), dtype=np.int64)
+    padded[:, 0] = padded[:, -1] = depot
+    padded[:, 1:-1] = paths
+    a, b = padded[:, :-1], padded[:, 1:]
+    edges = np.minimum(a, b) * (depot + 1) + np.maximum(a, b)
+    return len(np.unique(edges)) / (dim + 1)
+
+
+class Stats:
+    """Per-phase timers and counters of a run, with an optional JSON-lines sink and callback"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        sink: typing.Union[str, typing.TextIO] = None,
+        callback: typing.Callable[[dict], None] = None,
+        every: int = 1,
+    ):
+        """Create a Stats object
+
+        Parameters
+        ----------
+        enabled: bool = True
+            Whether to record anything at all.
+        sink: str or file (optional)
+            Path of a file, or an open file, to which a JSON line is written per record.
+        callback: callable (optional)
+            Function that is called with the dict of every record.
+        every: int = 1 (optional)
+            Only emit every so many records to the sink and the callback. The counters and
+            timers are always updated.
+        """
+        self.enabled = enabled
+        self.callback = callback
+        self.every = every
+        self._sink = open(sink, "a") if isinstance(sink, str) else sink
+        self._owns_sink = isinstance(sink, str)
+        self.reset()
+
+    def reset(self) -> None:
+        """Start the timers and counters from zero"""
+
+        self.phase_times = collections.defaultdict(float)
+        self.started = time.perf_counter()
+        self.records = 0
+        self.epoch = 0
+        self.evaluations = 0
+        self.best = float("inf")
+        self.diversity = None
+
+    def phase(self, name: str) -> typing.ContextManager:
+        """Time a phase of the algorithm, used as: with stats.phase("selection"): ..."""
+
+        if not self.enabled:
+            return _NO_TIMER
+        return _PhaseTimer(self, name)
+
+    def record(
+        self, epoch: int, evaluations: int, best: float, diversity: float = None
+    ) -> None:
+        """Update the counters after an epoch, and emit them to the sink and callback
+
+        Parameters
+        ----------
+        epoch: int
+            The number of finished epochs (or trials)
+        evaluations: int
+            The total number of tour evaluations so far
+        best: float
+            The best distance so far
+        diversity: float (optional)
+            The diversity of the population, see population_diversity
+        """
+        if not self.enabled:
+            return
+        self.epoch = epoch
+        self.evaluations = evaluations
+        self.best = min(self.best, float(best))
+        self.diversity = diversity
+        self.records += 1
+        if self.records % self.every:
+            return
+        if self._sink is not None or self.callback is not None:
+            record = self.as_dict()
+            if self._sink is not None:
+                self._sink.write(json.dumps(record) + "\n")
+                self._sink.flush()
+            if self.callback is not None:
+                self.callback(record)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def evaluations_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.evaluations / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        """The current state as a JSON serializable dict"""
+
+        return {
+            "epoch": self.epoch,
+            "elapsed": self.elapsed,
+            "evaluations": self.evaluations,
+            "evaluations_per_second": self.evaluations_per_second,
+            "best": self.best,
+            "diversity": self.diversity,
+            "phase_times": dict(self.phase_times),
+        }
+
+    def close(self) -> None:
+        """Close the sink, if it was opened by this object"""
+
+        if self._owns_sink and self._sink is not None:
+            self._sink.close()
+            self._sink = None
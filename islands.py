@@ -0,0 +1,155 @@
+import os
+import multiprocessing
+import multiprocessing.connection
+import threading
+import traceback
+
+import numpy as np
+from tsp import TSP
+from ga import GeneticAlgorithm
+
+
+def _island(tsp, idx, nIslands, gaKwargs, seed, topologySeed, epochs, migrationInterval, nMigrants, topology, migrantPaths, migrantDistances, barrier, timeout, connection):
+    """Runs one island of the island model in a worker process, see IslandModel.__call__. sends ("ok", result) or
+    ("error", exception, traceback) over the connection, a failing island aborts the barrier so the others stop as well."""
+    try:
+        result = _runIsland(tsp, idx, nIslands, gaKwargs, seed, topologySeed, epochs, migrationInterval, nMigrants, topology,
+                            migrantPaths, migrantDistances, barrier, timeout)
+    except BaseException as error:
+        barrier.abort()
+        try:
+            connection.send(("error", error, traceback.format_exc()))
+        except Exception:  # the exception can not be pickled
+            connection.send(("error", RuntimeError(repr(error)), traceback.format_exc()))
+    else:
+        connection.send(("ok", result))
+    finally:
+        connection.close()
+
+
+def _runIsland(tsp, idx, nIslands, gaKwargs, seed, topologySeed, epochs, migrationInterval, nMigrants, topology, migrantPaths, migrantDistances, barrier, timeout):
+    """the genetic algorithm of one island, returns its best path, best distance and history."""
+    tsp = tsp if isinstance(tsp, TSP) else tsp()
+    if len(migrantDistances) * tsp.dim != len(migrantPaths):
+        raise ValueError(f"the instance has {tsp.dim} cities, not {len(migrantPaths) // len(migrantDistances)}")
+    geneticAlgorithm = GeneticAlgorithm(rng=np.random.default_rng(seed), verbose=False, **gaKwargs)
+    geneticAlgorithm.initialize(tsp)
+    population = geneticAlgorithm.population
+    # views on the shared memory, every island owns one row of migrants
+    paths = np.frombuffer(migrantPaths, dtype=np.int32).reshape(nIslands, nMigrants, tsp.dim)
+    distances = np.frombuffer(migrantDistances, dtype=np.float64).reshape(nIslands, nMigrants)
+    # every island draws the same random topologies, so they agree on who sends to whom
+    topologyRng = np.random.default_rng(topologySeed)
+    for epoch in range(1, epochs + 1):
+        geneticAlgorithm.step()
+        if epoch % migrationInterval:
+            continue
+        best = np.argpartition(population.distances, nMigrants - 1)[:nMigrants]
+        paths[idx] = population.paths[best]
+        distances[idx] = population.distances[best]
+        barrier.wait(timeout)  # all migrants are written
+        order = np.arange(nIslands) if topology == "ring" else topologyRng.permutation(nIslands)
+        position = np.flatnonzero(order == idx)[0]
+        source = order[position - 1]
+        population.replaceWorst(paths[source], distances[source])
+        barrier.wait(timeout)  # all migrants are read, they can be overwritten in the next migration
+    bestRoute, bestDistance = population.best()
+    return bestRoute, bestDistance, np.asarray(geneticAlgorithm.history)
+
+
+class IslandModel:
+    def __init__(self, nIslands=None, epochs=2000, migrationInterval=25, nMigrants=2, topology="ring", seed=None, timeout=3600, **gaKwargs):
+        """run several genetic algorithms, the islands, in parallel processes that exchange their best paths.
+
+        parameters:
+            nIslands (int): the number of islands/processes, the number of cpus by default.
+            epochs (int): the number of epochs every island runs.
+            migrationInterval (int): the number of epochs between migrations.
+            nMigrants (int): the number of best paths every island sends to its neighbour per migration.
+            topology (str): "ring" to always send to the next island, or "random" to send along a random ring every migration.
+            seed (int): the master seed, every island gets its own np.random.Generator spawned from it.
+            timeout (float): the maximum number of seconds an island waits for the others at a migration, None to wait forever.
+            gaKwargs: the remaining arguments are passed on to GeneticAlgorithm, e.g. nPaths and mutationOperator.
+        """
+        self.nIslands = nIslands or os.cpu_count()
+        self.epochs = epochs
+        self.migrationInterval = migrationInterval
+        self.nMigrants = nMigrants
+        self.topology = topology
+        self.seed = seed
+        self.timeout = timeout
+        self.gaKwargs = gaKwargs
+
+    def __call__(self, tsp=None, dim=None):
+        """execute the island model, the results are stored in bestRoute, bestDistance, histories (the history of every
+        island, one per row) and history (the best distance over all islands per epoch).
+        raises a RuntimeError if one of the islands fails, the other islands are then stopped at their next migration.
+
+        parameters:
+            tsp (TSP or callable): the problem to optimize, the european capitals by default. either a TSP object, which is
+                copied to every island, or a picklable function without arguments that creates it in every island, e.g.
+                functools.partial(TSP.from_tsplib, "instance.tsp", plot=False, backend="memmap"), which avoids copying
+                large distance matrices.
+            dim (int): the number of cities of the instance a tsp function creates. without it the parent process calls the
+                function once to find it, building (and discarding) the whole instance, including its distance matrix.
+        """
+        tsp = TSP(plot=False) if tsp is None else tsp
+        if isinstance(tsp, TSP):
+            dim = tsp.dim
+        elif dim is None:
+            dim = tsp().dim
+        # migrants are exchanged through shared memory, instead of pickling them between the processes
+        migrantPaths = multiprocessing.RawArray("i", self.nIslands * self.nMigrants * dim)
+        migrantDistances = multiprocessing.RawArray("d", self.nIslands * self.nMigrants)
+        barrier = multiprocessing.Barrier(self.nIslands)
+        seeds = np.random.SeedSequence(self.seed).spawn(self.nIslands + 1)
+        gaKwargs = {**self.gaKwargs, "endParameter": "epoch", "endParameterMax": self.epochs}
+        processes, connections = [], []
+        for idx in range(self.nIslands):
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            args = (tsp, idx, self.nIslands, gaKwargs, seeds[idx], seeds[-1], self.epochs, self.migrationInterval, self.nMigrants,
+                    self.topology, migrantPaths, migrantDistances, barrier, self.timeout, sender)
+            process = multiprocessing.Process(target=_island, args=args)
+            process.start()
+            sender.close()  # only the island holds the sending end, so the pipe reports EOF if the island dies
+            processes.append(process)
+            connections.append(receiver)
+        results, errors = [None] * self.nIslands, {}
+        pending = dict(zip(connections, range(self.nIslands)))
+        while pending:
+            for connection in multiprocessing.connection.wait(list(pending)):
+                idx = pending.pop(connection)
+                try:
+                    message = connection.recv()
+                except EOFError:
+                    message = ("error", None, "")
+                if message[0] == "ok":
+                    results[idx] = message[1]
+                else:
+                    errors[idx] = message[1:]
+                    barrier.abort()  # release the islands that wait at a migration
+        for process in processes:
+            process.join()
+        if errors:
+            # report the island that failed first, not the islands that were stopped by the aborted barrier
+            idx = min(errors, key=lambda idx: isinstance(errors[idx][0], threading.BrokenBarrierError))
+            error, trace = errors[idx]
+            raise RuntimeError(f"island {idx} failed with exit code {processes[idx].exitcode}\n{trace}") from error
+        for idx, process in enumerate(processes):
+            if process.exitcode:
+                raise RuntimeError(f"island {idx} failed with exit code {process.exitcode}")
+
+        self.bestRoutes = [route for route, _, _ in results]
+        self.bestDistances = np.array([distance for _, distance, _ in results])
+        self.histories = np.array([history for _, _, history in results])
+        self.history = self.histories.min(axis=0)
+        best = np.argmin(self.bestDistances)
+        self.bestRoute, self.bestDistance = self.bestRoutes[best], self.bestDistances[best]
+
+    def plotPath(self):
+        with TSP(plot=True) as tsp:
+            tsp.plot_route(self.bestRoute, self.bestDistance)
+
+    def plotConvergence(self, label='', xInterval=1):
+        import matplotlib.pyplot as plt
+        plt.plot(range(0, len(self.history)*xInterval, xInterval), self.history, label=label)
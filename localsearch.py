@@ -0,0 +1,166 @@
+import time
+from collections import deque
+
+import numpy as np
+
+EPSILON = 1e-9  # minimal improvement of a move, to avoid cycling on rounding errors
+
+
+def neighborLists(tsp, nNeighbors=8):
+    """find the nNeighbors nearest nodes of every node of the tsp, the depot included as node tsp.depot.
+
+    parameters:
+        tsp (TSP): the problem.
+        nNeighbors (int): the number of candidate neighbours per node.
+
+    returns:
+        np.ndarray: a (dim + 1, nNeighbors) array of nodes, per row sorted from nearest to furthest.
+    """
+    from spatial import SpatialIndex  # scipy is only imported when the local search is used
+
+    return SpatialIndex(tsp).neighbors(nNeighbors)
+
+
+class LocalSearch:
+    def __init__(self, tsp, nNeighbors=8, orOpt=True):
+        """2-opt and or-opt local search on the tours of a tsp.
+
+        Only moves that connect a node to one of its nNeighbors nearest nodes are tried, every move is evaluated
+        by its change in length only, and nodes are only reconsidered once one of their edges changed (don't-look bits).
+
+        parameters:
+            tsp (TSP): the problem.
+            nNeighbors (int): the number of candidate neighbours per node.
+            orOpt (bool): whether to also try moving segments of 1 to 3 nodes, next to 2-opt moves.
+        """
+        self.tsp = tsp
+        self.neighbors = neighborLists(tsp, nNeighbors).tolist()
+        self.orOpt = orOpt
+
+    def __call__(self, path, maxMoves=None, deadline=None):
+        """improve a path until no improving move is left or the budget is used.
+
+        parameters:
+            path (np.ndarray): the path to improve, it is not changed.
+            maxMoves (int): the maximum number of moves to apply, unlimited by default.
+            deadline (float): time.perf_counter() value to stop at, unlimited by default.
+
+        returns:
+            np.ndarray: the improved path.
+            float: the change in length of the path, zero or negative.
+            int: the number of applied moves.
+        """
+        dist = self.tsp.distances.item
+        neighbors = self.neighbors
+        depot = self.tsp.depot
+        # the tour is handled as a cycle, with the depot as a regular node
+        tour = [depot] + [int(city) for city in path]
+        n = len(tour)
+        pos = [0] * n
+        for idx, node in enumerate(tour):
+            pos[node] = idx
+
+        def succ(node):
+            return tour[(pos[node] + 1) % n]
+
+        def pred(node):
+            return tour[pos[node] - 1]
+
+        def reverse(i, j):
+            """reverse the nodes from position i up to and including j, wrapping around the end"""
+            length = (j - i) % n + 1
+            if 2 * length > n:  # reversing the rest of the cycle gives the same cycle, and is shorter
+                i, j, length = (j + 1) % n, (i - 1) % n, n - length
+            for _ in range(length // 2):
+                tour[i], tour[j] = tour[j], tour[i]
+                pos[tour[i]], pos[tour[j]] = i, j
+                i, j = (i + 1) % n, (j - 1) % n
+
+        def twoOpt(a):
+            """replace the edge of a to its successor or predecessor b, and an edge (c, d), by (a, c) and (b, d)"""
+            for forward in (True, False):
+                b = succ(a) if forward else pred(a)
+                dab = dist(a, b)
+                for c in neighbors[a]:
+                    dac = dist(a, c)
+                    if dac >= dab:  # the new edge (a, c) has to be shorter than (a, b) to gain anything
+                        break
+                    d = succ(c) if forward else pred(c)
+                    if c == b or d == a:
+                        continue
+                    delta = dac + dist(b, d) - dab - dist(c, d)
+                    if delta < -EPSILON:
+                        if forward:
+                            reverse(pos[b], pos[c])
+                        else:
+                            reverse(pos[a], pos[d])
+                        return delta, (a, b, c, d)
+            return 0.0, None
+
+        def orOpt(a):
+            """move a segment of 1 to 3 nodes starting at a in between two nodes c and e, with a next to c"""
+            for segmentLength in (1, 2, 3):
+                if segmentLength + 2 >= n:
+                    break
+                for forward in (True, False):
+                    step, back = (succ, pred) if forward else (pred, succ)
+                    segment = [a]
+                    for _ in range(segmentLength - 1):
+                        segment.append(step(segment[-1]))
+                    s1, s2 = a, segment[-1]
+                    p, nx = back(s1), step(s2)
+                    removeGain = dist(p, s1) + dist(s2, nx) - dist(p, nx)
+                    if removeGain <= EPSILON:
+                        continue
+                    for c in neighbors[s1]:
+                        dcs = dist(c, s1)
+                        if dcs >= removeGain:
+                            break
+                        if c in segment:
+                            continue
+                        for e in (succ(c), pred(c)):
+                            if e in segment:
+                                continue
+                            delta = dcs + dist(s2, e) - dist(c, e) - removeGain
+                            if delta < -EPSILON:
+                                move(segment, c, e)
+                                return delta, (p, s1, s2, nx, c, e)
+            return 0.0, None
+
+        def move(segment, c, e):
+            """insert the segment, given from s1 to s2, in between the neighbours c and e, with s1 next to c"""
+            nodes = set(segment)
+            rest = [node for node in tour if node not in nodes]
+            ci = rest.index(c)
+            if rest[(ci + 1) % len(rest)] == e:
+                rest[ci + 1:ci + 1] = segment
+            else:
+                rest[ci:ci] = segment[::-1]
+            tour[:] = rest
+            for idx, node in enumerate(tour):
+                pos[node] = idx
+
+        queue = deque(tour)
+        active = [True] * n
+        moves, total = 0, 0.0
+        while queue:
+            if maxMoves is not None and moves >= maxMoves:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            a = queue.popleft()
+            active[a] = False
+            delta, touched = twoOpt(a)
+            if touched is None and self.orOpt:
+                delta, touched = orOpt(a)
+            if touched is None:
+                continue
+            moves += 1
+            total += delta
+            for node in touched:
+                if not active[node]:
+                    active[node] = True
+                    queue.append(node)
+
+        start = pos[depot]
+        return np.array(tour[start + 1:] + tour[:start], dtype=np.asarray(path).dtype), total, moves
@@ -1,47 +1,161 @@
+import time
 import numpy as np
 from tsp import TSP
-import matplotlib.pyplot as plt
+from instrumentation import Stats
 
 class RandomSearch:
-    def __init__(self, upper_limit=10000, plot=False, endParameter='epoch'):
+    def __init__(self, upper_limit=10000, plot=False, endParameter='epoch', rng=None, batch_size=1024, history='full', stats=None, target_gap=None, lower_bound=None,
+                 max_time=None, max_evaluations=None):
         """
         Initialize the RandomSearch class.
 
         Parameters:
             upper_limit (int): The max number of trials without improvement before stopping.
             plot (bool): Whether to plot the route at the end.
+            rng (np.random.Generator): Source of the random routes, a fresh unseeded one by default.
+            batch_size (int): The number of routes that are sampled and scored at once. Smaller batches are used
+                for large instances, so a batch holds at most about a million cities.
+            history (str): 'full' to record the best distance after every trial, or 'improvements' to only record
+                the trials at which the best distance improved, see convergence_history and improvement_epochs.
+            stats (Stats): Collects per-phase timings and counters of the run, disabled by default.
+            target_gap (float): Stop as soon as the best route is at most this fraction longer than lower_bound, e.g. 0.01.
+            lower_bound (float): Lower bound on the length of the shortest route, computed with bounds.lower_bound by default.
+                That costs about iterations * n**2 distance lookups (seconds at 1000 cities, minutes at several thousand),
+                so pass a precomputed bound for large instances.
+            max_time (float): Stop after this many seconds, checked after every batch. Unlimited by default.
+            max_evaluations (int): Stop after this many tour evaluations since the start of the search (see TSP.evaluations,
+                routes whose length is taken from the tsp cache do not count). Unlimited by default.
         """
         self.plot = plot
-        self.end = (lambda: self.epoch>=upper_limit) if endParameter=='epoch' else (lambda: self.no_improvement_counter>=upper_limit) 
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.endParameter = endParameter
+        self.upper_limit = upper_limit
+        self.end = (lambda: self.epoch>=upper_limit) if endParameter=='epoch' else (lambda: self.no_improvement_counter>=upper_limit)
+        self.batch_size = batch_size
+        self.history = history
+        self.stats = Stats(enabled=False) if stats is None else stats
+        self.target_gap = target_gap
+        self.lower_bound = lower_bound
+        self.max_time = max_time
+        self.max_evaluations = max_evaluations
+        self.evaluations = 0  # Tour evaluations since the start of the search
         self.best_route = None
         self.best_distance = float('inf')
-        self.convergence_history = []  # Track best distance over time for convergence
+        # Track best distance over time for convergence, in a preallocated array that is trimmed at the end
+        self.convergence_history = np.empty(upper_limit if endParameter == 'epoch' and history == 'full' else 1024, dtype=np.float32)
+        self.improvement_epochs = np.empty(0, dtype=np.int64)  # Trial of every improvement, if history == 'improvements'
         self.epoch = 0
         self.no_improvement_counter = 0
 
-    def __call__(self):
-        """Performs the random search for the best TSP route."""
-        tsp = TSP(plot=False)     
-        while not self.end():
-            # Generate a random route
-            random_route = np.random.permutation(tsp.dim)
-            distance = tsp(random_route)
-
-            # If the new route is better, update the best route
-            if distance < self.best_distance:
-                self.best_distance = distance
-                self.best_route = random_route
-                self.no_improvement_counter = 0  # Reset counter if improvement is found
-            else:
-                self.no_improvement_counter += 1
-            self.epoch += 1
-            # Record the best distance at this step for convergence tracking
-            self.convergence_history.append(self.best_distance)
+    def __call__(self, tsp=None):
+        """Performs the random search for the best TSP route.
+
+        Parameters:
+            tsp (TSP): The problem to solve, the European capitals by default.
+        """
+        tsp = TSP(plot=False) if tsp is None else tsp
+        for _ in self.run_iter(tsp):
+            pass
 
         # Optionally plot the best route found
         if self.plot:
             self.plot_best_route(tsp)
 
+    def run_iter(self, tsp=None):
+        """Performs the random search as a generator, that yields the best route so far after every batch.
+        The search can be stopped at any moment by no longer iterating, the history is trimmed once the generator is closed.
+
+        Parameters:
+            tsp (TSP): The problem to solve, the European capitals by default.
+
+        Yields:
+            tuple: The best route, its distance, the number of trials and the number of tour evaluations since the start of
+                the search, see max_evaluations. Without a tsp cache both numbers are the same.
+        """
+        self.start_time = time.perf_counter()
+        tsp = TSP(plot=False) if tsp is None else tsp
+        self._start_evaluations = tsp.evaluations
+        self.evaluations = 0
+        stats = self.stats
+        stats.reset()
+        if self.target_gap is not None and self.lower_bound is None:
+            from bounds import lower_bound
+            self.lower_bound = lower_bound(tsp)
+        batch_size = max(1, min(self.batch_size, 2**20 // tsp.dim))
+        self._n_recorded = 0
+        self._improvement_epochs = []
+        try:
+            while not self.stopped():
+                self._batch(tsp, batch_size)
+                yield self.best_route, self.best_distance, self.epoch, self.evaluations
+        finally:
+            self.convergence_history = self.convergence_history[:self._n_recorded]
+            if self._improvement_epochs:
+                self.improvement_epochs = np.concatenate(self._improvement_epochs)
+
+    def stopped(self):
+        """Whether one of the stopping criteria is met: endParameter, target_gap, max_time or max_evaluations."""
+        return (self.end() or self.converged()
+                or (self.max_time is not None and time.perf_counter() - self.start_time >= self.max_time)
+                or (self.max_evaluations is not None and self.evaluations >= self.max_evaluations))
+
+    def _batch(self, tsp, batch_size):
+        """Sample and score one batch of routes, and update the best route, the counters and the history."""
+        stats = self.stats
+        size = min(batch_size, self.upper_limit - self.epoch) if self.endParameter == 'epoch' else batch_size
+        if self.max_evaluations is not None:
+            # Every trial is at most one evaluation, so the batch never exceeds the budget
+            size = min(size, self.max_evaluations - self.evaluations)
+        # Generate a batch of random routes, the argsort of random numbers gives uniform permutations
+        with stats.phase("sampling"):
+            random_routes = np.argsort(self.rng.random((size, tsp.dim)), axis=1)
+        with stats.phase("evaluation"):
+            distances = tsp.evaluate_batch(random_routes)
+
+        # Best distance before and after every trial, and the trials that improved it
+        best_distances = np.minimum.accumulate(np.concatenate([[self.best_distance], distances]))
+        improved = distances < best_distances[:-1]
+        # Number of trials without improvement after every trial
+        trials = np.arange(size)
+        last_improvement = np.maximum.accumulate(np.where(improved, trials, -1))
+        counter = np.where(last_improvement >= 0, trials - last_improvement, self.no_improvement_counter + trials + 1)
+        stop = counter >= self.upper_limit if self.endParameter != 'epoch' else np.zeros(size, dtype=bool)
+        if self.target_gap is not None:
+            stop |= best_distances[1:] <= self.lower_bound * (1 + self.target_gap)
+        if stop.any():
+            # Stop at the same trial as a search that checks after every trial
+            size = np.argmax(stop) + 1
+            improved, last_improvement = improved[:size], last_improvement[:size]
+
+        # If one of the new routes is better, update the best route
+        if improved.any():
+            best = last_improvement[-1]
+            self.best_distance = distances[best]
+            self.best_route = random_routes[best].copy()
+        self.no_improvement_counter = int(counter[size - 1])
+
+        # Record the best distance at every step for convergence tracking
+        if self.history == 'full':
+            recorded = best_distances[1:size + 1]
+        else:
+            recorded = distances[:size][improved]
+            self._improvement_epochs.append(self.epoch + np.flatnonzero(improved))
+        if self._n_recorded + len(recorded) > len(self.convergence_history):
+            self.convergence_history = np.resize(self.convergence_history, max(2 * len(self.convergence_history), self._n_recorded + len(recorded)))
+        self.convergence_history[self._n_recorded:self._n_recorded + len(recorded)] = recorded
+        self._n_recorded += len(recorded)
+        self.epoch += size
+        self.evaluations = tsp.evaluations - self._start_evaluations
+        stats.record(self.epoch, self.evaluations, self.best_distance)
+
+    def gap(self):
+        """The fraction by which the best route is longer than lower_bound, an upper bound on its distance to the optimum."""
+        return (self.best_distance - self.lower_bound) / self.lower_bound
+
+    def converged(self):
+        """Whether the best route is within target_gap of the optimum."""
+        return self.target_gap is not None and self.gap() <= self.target_gap
+
     def plot_best_route(self, tsp):
         """Plot the best route found using the TSP plotting utility."""
         with TSP(plot=True) as tsp_plot:
@@ -49,4 +163,9 @@ class RandomSearch:
 
     def plot_convergence(self, label="Random Search Convergence"):
         """Plot the convergence history of the search."""
-        plt.plot(self.convergence_history, label=label)
+        import matplotlib.pyplot as plt
+        if self.history == 'full':
+            plt.plot(self.convergence_history, label=label)
+        else:
+            epochs = np.append(self.improvement_epochs, self.epoch - 1)
+            plt.step(epochs, np.append(self.convergence_history, self.best_distance), where='post', label=label)
@@ -0,0 +1,222 @@
+"""Spatial index over the cities of a TSP object
+
+The cities (and the depot) are stored in a KD-tree. For the haversine metrics the points
+are first mapped to 3-D vectors on the unit sphere, the straight-line distance between
+those vectors increases with the great-circle distance, so nearest neighbours in the tree
+are nearest neighbours on the globe. The index is used for candidate neighbour lists and
+to construct good initial tours in roughly O(n log n).
+"""
+
+import typing
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+if typing.TYPE_CHECKING:
+    from tsp import TSP
+
+
+def unit_vectors(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    """Map latitudes and longtitudes (in degrees) to 3-D vectors on the unit sphere"""
+
+    lat, lng = np.radians(lat), np.radians(lng)
+    return np.column_stack(
+        [np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)]
+    )
+
+
+def hilbert_index(x: np.ndarray, y: np.ndarray, order: int = 16) -> np.ndarray:
+    """Position of the points on a Hilbert curve through a 2**order by 2**order grid
+
+    Parameters
+    ----------
+    x: np.ndarray[int]
+    y: np.ndarray[int]
+        Grid coordinates of the points, from 0 up to 2**order
+
+    Returns
+    -------
+        np.ndarray
+            The index along the curve of every point
+    """
+    n = 2**order
+    x, y = np.array(x, dtype=np.int64), np.array(y, dtype=np.int64)
+    d = np.zeros(len(x), dtype=np.int64)
+    s = n // 2
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant, so the curve stays continuous
+        flip = ~ry & rx
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        x, y = np.where(~ry, y, x), np.where(~ry, x, y)
+        s //= 2
+    return d
+
+
+class SpatialIndex:
+    """KD-tree over the cities of a TSP object, with the depot as node tsp.depot"""
+
+    def __init__(self, tsp: "TSP"):
+        """Create the spatial index
+
+        Parameters
+        ----------
+        tsp: TSP
+            The problem, with a "haversine", "capitals" or "euclidean" metric
+        """
+
+        self.tsp = tsp
+        self.points = np.vstack([tsp.coordinates, tsp.depot_coordinates])
+        if tsp.metric == "haversine":
+            self.embedding = unit_vectors(self.points[:, 1], self.points[:, 0])
+        elif tsp.metric == "capitals":
+            # this metric uses the lng values as latitudes, see distances.METRICS
+            self.embedding = unit_vectors(self.points[:, 0], self.points[:, 1])
+        elif tsp.metric == "euclidean":
+            self.embedding = self.points
+        else:
+            raise ValueError(f"No spatial index for metric {tsp.metric}")
+        self.tree = cKDTree(self.embedding)
+        self.n_nodes = len(self.points)
+
+    def neighbors(self, k: int = 8) -> np.ndarray:
+        """The k nearest other nodes of every node
+
+        Returns
+        -------
+            np.ndarray
+                Matrix of size (dim + 1, k), per row sorted from nearest to furthest
+        """
+        k = min(k, self.n_nodes - 1)
+        _, idx = self.tree.query(self.embedding, k + 1)
+        idx = idx.reshape(self.n_nodes, k + 1)
+        # drop the node itself, which is not always the first result if points coincide
+        others = idx != np.arange(self.n_nodes)[:, None]
+        order = np.argsort(~others, axis=1, kind="stable")
+        return np.take_along_axis(idx, order, axis=1)[:, :k]
+
+    def _path(self, cycle: typing.List[int]) -> np.ndarray:
+        """Convert a cycle through all nodes to a path through the cities, starting after the depot"""
+
+        cycle = np.asarray(cycle)
+        start = np.flatnonzero(cycle == self.tsp.depot)[0]
+        return np.concatenate([cycle[start + 1 :], cycle[:start]])
+
+    def _nearest_unvisited(self, node: int, visited: np.ndarray) -> int:
+        """The nearest node that is not visited yet, querying more neighbours when needed"""
+
+        k = 8
+        while True:
+            k = min(k, self.n_nodes)
+            _, idx = self.tree.query(self.embedding[node], k)
+            for candidate in np.atleast_1d(idx):
+                if not visited[candidate]:
+                    return int(candidate)
+            if k == self.n_nodes:
+                raise ValueError("All nodes are visited")
+            k *= 4
+
+    def nearest_neighbor_tour(self) -> np.ndarray:
+        """Tour that starts at the depot and always goes to the nearest unvisited city"""
+
+        visited = np.zeros(self.n_nodes, dtype=bool)
+        node = self.tsp.depot
+        visited[node] = True
+        cycle = [node]
+        for _ in range(self.n_nodes - 1):
+            node = self._nearest_unvisited(node, visited)
+            visited[node] = True
+            cycle.append(node)
+        return self._path(cycle)
+
+    def greedy_edge_tour(self, k: int = 10) -> np.ndarray:
+        """Tour built from the shortest candidate edges (between k nearest neighbours) that
+        keep every node at degree two or less without closing a cycle. The resulting
+        fragments are joined by nearest neighbour search over their endpoints."""
+
+        n = self.n_nodes
+        neighbors = self.neighbors(k)
+        a = np.repeat(np.arange(n), neighbors.shape[1])
+        b = neighbors.ravel()
+        a, b = np.minimum(a, b), np.maximum(a, b)
+        edges = np.unique(np.column_stack([a, b]), axis=0)
+        lengths = np.asarray(self.tsp.distances[edges[:, 0], edges[:, 1]], dtype=float)
+        edges = edges[np.argsort(lengths, kind="stable")]
+
+        parent = list(range(n))
+
+        def find(node):
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        degree = [0] * n
+        adjacent = [[] for _ in range(n)]
+        for u, v in edges.tolist():
+            if degree[u] < 2 and degree[v] < 2:
+                root_u, root_v = find(u), find(v)
+                if root_u != root_v:
+                    parent[root_u] = root_v
+                    degree[u] += 1
+                    degree[v] += 1
+                    adjacent[u].append(v)
+                    adjacent[v].append(u)
+
+        # walk every fragment from one of its endpoints
+        other_end = {}
+        fragments = []
+        seen = [False] * n
+        for start in range(n):
+            if seen[start] or degree[start] == 2:
+                continue
+            fragment, previous, node = [start], -1, start
+            seen[start] = True
+            while True:
+                following = [v for v in adjacent[node] if v != previous]
+                if not following:
+                    break
+                previous, node = node, following[0]
+                seen[node] = True
+                fragment.append(node)
+            fragments.append(fragment)
+            other_end[fragment[0]] = (len(fragments) - 1, False)
+            other_end[fragment[-1]] = (len(fragments) - 1, True)
+
+        # chain the fragments, always continuing at the nearest free endpoint
+        used = np.ones(n, dtype=bool)
+        used[list(other_end)] = False
+        cycle = list(fragments[0])
+        used[fragments[0][0]] = used[fragments[0][-1]] = True
+        for _ in range(len(fragments) - 1):
+            endpoint = self._nearest_unvisited(cycle[-1], used)
+            idx, reverse = other_end[endpoint]
+            fragment = fragments[idx][::-1] if reverse else fragments[idx]
+            used[fragment[0]] = used[fragment[-1]] = True
+            cycle.extend(fragment)
+        return self._path(cycle)
+
+    def space_filling_curve_tour(self, order: int = 16) -> np.ndarray:
+        """Tour that visits the cities in the order of a Hilbert curve through the plane of
+        the coordinates"""
+
+        low, high = self.points.min(axis=0), self.points.max(axis=0)
+        scaled = (self.points - low) / np.maximum(high - low, 1e-12) * (2**order - 1)
+        grid = np.round(scaled).astype(np.int64)
+        cycle = np.argsort(hilbert_index(grid[:, 0], grid[:, 1], order), kind="stable")
+        return self._path(cycle)
+
+    def tour(self, method: str) -> np.ndarray:
+        """Construct a tour with one of "nearest", "greedy" or "spacefilling" """
+
+        constructions = {
+            "nearest": self.nearest_neighbor_tour,
+            "greedy": self.greedy_edge_tour,
+            "spacefilling": self.space_filling_curve_tour,
+        }
+        if method not in constructions:
+            raise ValueError(f"Unknown tour construction {method}")
+        return constructions[method]()
@@ -13,15 +13,21 @@ Installation
 
 import warnings
 import math
-import io
+import collections
+import functools
+import time
 import typing
 
-import pandas as pd
 import numpy as np
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-import svgpath2mpl
-import geopandas
+
+from distances import make_distances
+
+# The plotting dependencies are only imported when a plot is made, see plot_europe
+if typing.TYPE_CHECKING:
+    import pandas as pd
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
+    import geopandas
 
 
 DATA = """hckey,capital,capital_lat,capital_lng
@@ -91,9 +97,52 @@ LEIDEN_SVG = """M380.52 239.51l-30.679-29.744-29.757-34.948-14.23-13.797v-13.258
 LEIDEN = 4.497010, 52.160114
 
 
+def read_capitals(data: str = DATA) -> typing.Tuple[typing.List[str], np.ndarray]:
+    """Read the capitals from a csv string in the format of DATA, without pandas
+
+    Parameters
+    ----------
+    data: str = DATA (optional)
+        csv with a header and hckey, capital, capital_lat, capital_lng columns
+
+    Returns
+    -------
+        (list[str], np.ndarray)
+            The names of the capitals and a matrix of their lng, lat values
+    """
+
+    rows = [line.split(",") for line in data.strip().splitlines()[1:]]
+    names = [row[1] for row in rows]
+    coordinates = np.array([[float(row[3]), float(row[2])] for row in rows])
+    return names, coordinates
+
+
+@functools.lru_cache(maxsize=None)
+def _world() -> "geopandas.GeoDataFrame":
+    """The Natural Earth countries, read once per process"""
+
+    import geopandas
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return geopandas.read_file(geopandas.datasets.get_path("naturalearth_lowres"))
+
+
+@functools.lru_cache(maxsize=None)
+def _leiden_marker() -> "mpl.path.Path":
+    """The marker of Leiden, parsed from LEIDEN_SVG once per process"""
+
+    import matplotlib as mpl
+    import svgpath2mpl
+
+    keys = svgpath2mpl.parse_path(LEIDEN_SVG)
+    keys.vertices -= keys.vertices.mean(axis=0)
+    return keys.transformed(mpl.transforms.Affine2D().rotate_deg(180))
+
+
 def plot_europe(
-    data: pd.DataFrame, fig: plt.Figure = None, ax: plt.Axes = None
-) -> typing.Tuple[plt.Figure, plt.Axes]:
+    data: "pd.DataFrame", fig: "plt.Figure" = None, ax: "plt.Axes" = None
+) -> typing.Tuple["plt.Figure", "plt.Axes"]:
     """Plotting utilitly, plots a map of Europe, with Leiden explitly marked
 
     Parameters
@@ -110,18 +159,13 @@ def plot_europe(
         (mpl.Figure, plt.Axes,)
             Handles to the plot
     """
+    import matplotlib.pyplot as plt
 
     if fig is None:
         fig, ax = plt.subplots(1, 1, figsize=(15, 8))
 
-    keys = svgpath2mpl.parse_path(LEIDEN_SVG)
-    keys.vertices -= keys.vertices.mean(axis=0)
-
-    keys = keys.transformed(mpl.transforms.Affine2D().rotate_deg(180))
-
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        world = geopandas.read_file(geopandas.datasets.get_path("naturalearth_lowres"))
+    keys = _leiden_marker()
+    world = _world()
 
     world.plot(ax=ax, color="lightgray", edgecolor="black", alpha=0.5)
 
@@ -178,7 +222,20 @@ def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
 class TSP:
     """Traveling Salesperson object, with plotting utility"""
 
-    def __init__(self, plot: bool = True):
+    def __init__(
+        self,
+        plot: bool = True,
+        coordinates: np.ndarray = None,
+        depot: typing.Tuple[float, float] = LEIDEN,
+        names: typing.List[str] = None,
+        metric: str = None,
+        backend: str = "auto",
+        memory_budget: int = 2**30,
+        disk_budget: int = 2**34,
+        cache_dir: str = None,
+        cache_size: int = 0,
+        fps: float = 10,
+    ):
         """Create a Traveling Salesperson object
 
         Parameters
@@ -187,25 +244,212 @@ class TSP:
             Whether to create an (interactive) plot. When running this for the optimization
             its advised to turn this off, as it can take quite a bit of extra time to visualize
             the tour on every function call.
+        coordinates: np.ndarray = None (optional)
+            Matrix of size (n, 2) with the lng, lat (or x, y) values of the cities. By default
+            the European capitals in DATA are used, see also from_csv and from_tsplib.
+        depot: (float, float) = LEIDEN (optional)
+            The lng, lat (or x, y) values of the start and end point of every tour.
+        names: list[str] = None (optional)
+            Names of the cities, used for plotting.
+        metric: str = None (optional)
+            Distance between two points, one of distances.METRICS. By default "haversine",
+            or for the capitals the metric the original implementation used.
+        backend: str = "auto" (optional)
+            How the distances are stored, "dense" for a matrix in memory (float64 if that
+            fits memory_budget, otherwise float32), "memmap" for a float32 matrix cached on disk, "function" to compute the distances on the fly,
+            or "auto" to choose one based on memory_budget and disk_budget.
+        memory_budget: int = 2**30 (optional)
+            The number of bytes a distance matrix may use in memory, for backend="auto" and
+            the precision of the "dense" backend.
+        disk_budget: int = 2**34 (optional)
+            The number of bytes a cached distance matrix may use on disk, for backend="auto".
+        cache_dir: str = None (optional)
+            Directory of the cached distance matrices for the "memmap" backend.
+        cache_size: int = 0 (optional)
+            The number of tour lengths to remember, 0 disables the cache. A tour and its
+            reverse share one entry, the least recently used entry is evicted first.
+            Lengths taken from the cache are counted in cache_hits, not in evaluations.
+        fps: float = 10 (optional)
+            The maximum number of route updates per second in the plot, updates in between
+            are skipped. None to draw every update.
         """
 
-        self.data = pd.read_csv(io.StringIO(DATA))
+        if coordinates is None:
+            names, coordinates = read_capitals()
+            metric = metric or "capitals"
+        self.coordinates = np.asarray(coordinates, dtype=float)
+        self.names = names if names is not None else [str(i) for i in range(len(self.coordinates))]
+        self.depot_coordinates = np.asarray(depot, dtype=float)
+        self.metric = metric or "haversine"
         self.plot = plot
+        self.fps = fps
         self.line = None
-        self.dim = len(self.data)
+        self._background = None
+        self._last_draw = -math.inf
+        self._pending = None
+        self.dim = len(self.coordinates)
+        self._data = None
+
+        self.evaluations = 0
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = collections.OrderedDict()
+
+        # The depot is stored as the last row/column of the distance matrix
+        self.depot = self.dim
+        self.distances = make_distances(
+            np.vstack([self.coordinates, self.depot_coordinates]),
+            self.metric,
+            backend,
+            memory_budget,
+            disk_budget,
+            cache_dir,
+        )
+
+    @classmethod
+    def from_csv(
+        cls,
+        path: str,
+        lat_column: str = "lat",
+        lng_column: str = "lng",
+        name_column: str = None,
+        depot: typing.Union[int, typing.Tuple[float, float]] = 0,
+        **kwargs,
+    ) -> "TSP":
+        """Create a Traveling Salesperson object from a csv file with a header
+
+        Parameters
+        ----------
+        path: str
+            Path of the csv file
+        lat_column: str = "lat" (optional)
+        lng_column: str = "lng" (optional)
+            Names of the columns with the latitudes and longtitudes
+        name_column: str = None (optional)
+            Name of the column with the names of the stops
+        depot: int or (float, float) = 0 (optional)
+            Either the row of the stop that is the depot, which is then not one of the
+            cities of the tour, or the lng, lat values of a depot that is not in the file.
+        kwargs:
+            Passed on to the constructor, e.g. plot and backend
+
+        Returns
+        -------
+            TSP
+        """
+        import csv
+
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        coordinates = np.array([[float(row[lng_column]), float(row[lat_column])] for row in rows])
+        names = [row[name_column] for row in rows] if name_column else None
+        return cls._with_depot(coordinates, names, depot, **kwargs)
+
+    @classmethod
+    def from_tsplib(
+        cls, path: str, depot: typing.Union[int, typing.Tuple[float, float]] = 0, **kwargs
+    ) -> "TSP":
+        """Create a Traveling Salesperson object from a TSPLIB file with a NODE_COORD_SECTION.
+        EUC_2D, CEIL_2D and ATT instances use the (unrounded) euclidean distance, GEO
+        instances are converted to decimal degrees and use the haversine distance.
+
+        Parameters
+        ----------
+        path: str
+            Path of the .tsp file
+        depot: int or (float, float) = 0 (optional)
+            Either the (0-based) node that is the depot, or the coordinates of a depot that
+            is not in the file, see from_csv.
+        kwargs:
+            Passed on to the constructor, e.g. plot and backend
+
+        Returns
+        -------
+            TSP
+        """
+        header, nodes = {}, []
+        with open(path) as f:
+            in_coordinates = False
+            for line in f:
+                line = line.strip()
+                if not line or line == "EOF":
+                    continue
+                if line == "NODE_COORD_SECTION":
+                    in_coordinates = True
+                elif in_coordinates and line[0].isdigit():
+                    _, x, y = line.split()[:3]
+                    nodes.append((float(x), float(y)))
+                elif ":" in line:
+                    in_coordinates = False
+                    key, value = line.split(":", 1)
+                    header[key.strip().upper()] = value.strip()
+                else:
+                    in_coordinates = False
+
+        edge_weight_type = header.get("EDGE_WEIGHT_TYPE", "EUC_2D").upper()
+        nodes = np.array(nodes)
+        if edge_weight_type in ("EUC_2D", "CEIL_2D", "ATT"):
+            kwargs.setdefault("metric", "euclidean")
+            coordinates = nodes
+        elif edge_weight_type == "GEO":
+            # DDD.MM values, x is the latitude and y the longtitude
+            degrees = np.trunc(nodes)
+            decimal = degrees + 5.0 * (nodes - degrees) / 3.0
+            kwargs.setdefault("metric", "haversine")
+            coordinates = decimal[:, ::-1]
+        else:
+            raise ValueError(f"Unsupported EDGE_WEIGHT_TYPE {edge_weight_type}")
+        return cls._with_depot(coordinates, None, depot, **kwargs)
+
+    @classmethod
+    def _with_depot(cls, coordinates, names, depot, **kwargs) -> "TSP":
+        """Create the object, with depot either the index of one of the coordinates or a point"""
+
+        if np.ndim(depot) == 0:
+            keep = np.arange(len(coordinates)) != depot
+            depot_coordinates = coordinates[depot]
+            names = [name for name, k in zip(names, keep) if k] if names else None
+            return cls(coordinates=coordinates[keep], depot=depot_coordinates, names=names, **kwargs)
+        return cls(coordinates=coordinates, depot=depot, names=names, **kwargs)
+
+    @property
+    def data(self) -> "pd.DataFrame":
+        """The capitals as a pandas DataFrame, only created (and pandas imported) when used"""
+
+        if self._data is None:
+            import pandas as pd
+
+            self._data = pd.DataFrame(
+                {
+                    "capital": self.names,
+                    "capital_lat": self.coordinates[:, 1],
+                    "capital_lng": self.coordinates[:, 0],
+                }
+            )
+        return self._data
 
     def __enter__(self):
         """Create a plot, i.e. figure and axes, if self.plot == True."""
 
         if self.plot:
+            import matplotlib.pyplot as plt
+
             plt.ion()
             _, self.ax = plot_europe(self.data)
+            self.line = None
         return self
 
     def __exit__(self, *args, **kwargs):
         """Stop plotting interactively, but keep showing the plot if self.plot == True."""
 
         if self.plot:
+            import matplotlib.pyplot as plt
+
+            if self._pending is not None:
+                self._draw_route(*self._pending)
+                self._pending = None
+
             plt.ioff()
             plt.show()
 
@@ -225,34 +469,228 @@ class TSP:
         -------
             float The length of the tour
         """
-        assert len(path_idx) == len(self.data), "Make sure you visit all cities"
+        assert len(path_idx) == self.dim, "Make sure you visit all cities"
         assert len(set(path_idx)) == len(path_idx), "Make sure all cities are unique"
 
-        path = self.create_path(path_idx)
+        path_idx = np.asarray(path_idx)
+        if self.cache_size:
+            key = self._cache_key(path_idx)
+            if key in self._cache:
+                self.cache_hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self.cache_misses += 1
+
+        self.evaluations += 1
+        route_length = float(
+            self.distances[self.depot, path_idx[0]]
+            + self.distances[path_idx[:-1], path_idx[1:]].sum(dtype=float)
+            + self.distances[path_idx[-1], self.depot]
+        )
+        if self.cache_size:
+            self._cache_store(key, route_length)
+        return route_length
 
-        current = path[0]
-        route_length = 0
+    def evaluate_batch(self, paths: np.ndarray, chunk_size: int = None) -> np.ndarray:
+        """Calculate the route lengths of many tours at once.
+        This is equivalent to calling the object on every row of paths, but the lengths
+        are computed in a single vectorized pass per chunk of rows.
 
-        for stop in path[1:]:
-            route_length += haversine(*current, *stop)
-            current = stop
+        Parameters
+        ----------
+        paths: np.ndarray[int]
+            Integer matrix of size (n_tours, n), every row is a tour as accepted by __call__.
+        chunk_size: int = None (optional)
+            The number of tours that are processed at once, this bounds the size of the
+            temporary arrays. By default chunks of roughly a million cities are used.
 
-        return route_length
+        Returns
+        -------
+            np.ndarray The length of every tour
+        """
+        paths = np.asarray(paths)
+        assert paths.ndim == 2, "Make sure paths is a 2d array of tours"
+        assert paths.shape[1] == self.dim, "Make sure you visit all cities"
+
+        if chunk_size is None:
+            chunk_size = max(1, 2**20 // self.dim)
+
+        if self.cache_size:
+            keys = [self._cache_key(path) for path in paths]
+            cached = np.array([key in self._cache for key in keys], dtype=bool)
+            lengths = np.empty(len(paths))
+            for idx in np.flatnonzero(cached):
+                self._cache.move_to_end(keys[idx])
+                lengths[idx] = self._cache[keys[idx]]
+            missing = np.flatnonzero(~cached)
+            lengths[missing] = self._evaluate_chunks(paths[missing], chunk_size)
+            for idx in missing:
+                self._cache_store(keys[idx], lengths[idx])
+            self.cache_hits += int(cached.sum())
+            self.cache_misses += len(missing)
+            return lengths
+
+        return self._evaluate_chunks(paths, chunk_size)
+
+    def _evaluate_chunks(self, paths: np.ndarray, chunk_size: int) -> np.ndarray:
+        """Route lengths of all rows of paths, see evaluate_batch"""
+
+        self.evaluations += len(paths)
+        cities = np.arange(self.dim)
+        lengths = np.empty(len(paths))
+        for start in range(0, len(paths), chunk_size):
+            chunk = paths[start : start + chunk_size]
+            assert (np.sort(chunk, axis=1) == cities).all(), "Make sure all cities are unique"
+
+            lengths[start : start + chunk_size] = (
+                self.distances[self.depot, chunk[:, 0]]
+                + self.distances[chunk[:, :-1], chunk[:, 1:]].sum(axis=1, dtype=float)
+                + self.distances[chunk[:, -1], self.depot]
+            )
+        return lengths
+
+    @staticmethod
+    def _cache_key(path_idx: np.ndarray) -> bytes:
+        """Key of a tour in the cache, a tour and its reverse have the same length and key"""
+
+        path_idx = np.asarray(path_idx, dtype=np.int32)
+        if path_idx[0] > path_idx[-1]:
+            path_idx = path_idx[::-1]
+        return path_idx.tobytes()
+
+    def _cache_store(self, key: bytes, route_length: float) -> None:
+        """Remember a route length, evicting the least recently used one when the cache is full"""
+
+        self._cache[key] = route_length
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def cache_info(self) -> typing.Dict[str, int]:
+        """Counters of the tour length cache, and the number of actual evaluations"""
+
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "size": len(self._cache),
+            "max_size": self.cache_size,
+            "evaluations": self.evaluations,
+        }
+
+    def delta(self, path_idx: np.ndarray, move: typing.Tuple[str, int, int]) -> float:
+        """Calculate the change in route length caused by applying a move to a tour,
+        without walking the tour. Only the edges that the move changes are looked up.
+
+        Parameters
+        ----------
+        path_idx: np.ndarray[int]
+            The tour before the move is applied.
+        move: (str, int, int)
+            The move as returned by the mutation operators of the genetic algorithm,
+            i.e. ("swap", i, j) to swap the cities at positions i and j, or
+            ("inversion", i, j) to reverse path_idx[i:j], or for i > j the
+            wrapped segment path_idx[i:] + path_idx[:j + 1].
+
+        Returns
+        -------
+            float The length of the moved tour minus the length of path_idx
+        """
+        operator, i, j = move
+        return float(self.delta_batch(np.asarray(path_idx)[None], operator, [[i, j]])[0])
+
+    def delta_batch(self, paths: np.ndarray, operator: str, moves: np.ndarray) -> np.ndarray:
+        """Vectorized version of delta, for one move per tour.
+
+        Parameters
+        ----------
+        paths: np.ndarray[int]
+            Integer matrix of size (n_tours, n), the tours before the moves are applied.
+        operator: str
+            Either "swap" or "inversion", see delta.
+        moves: np.ndarray[int]
+            Integer matrix of size (n_tours, 2), the positions i, j of every move.
+
+        Returns
+        -------
+            np.ndarray The change in route length of every tour
+        """
+        paths = np.asarray(paths)
+        moves = np.asarray(moves)
+        rows = np.arange(len(paths))
+        i, j = moves[:, 0], moves[:, 1]
+        n = self.dim
+
+        def d(a, b):
+            """Distances between the nodes a and b, in double precision"""
+            return np.asarray(self.distances[a, b], dtype=float)
+
+        def node(k):
+            """City at position k of the tour with the depot pre- and appended"""
+            inner = paths[rows, np.clip(k - 1, 0, n - 1)]
+            return np.where((k == 0) | (k == n + 1), self.depot, inner)
+
+        if operator == "swap":
+            a, b = np.minimum(i, j) + 1, np.maximum(i, j) + 1
+            qa, qb = node(a), node(b)
+            qa0, qa1, qb0, qb1 = node(a - 1), node(a + 1), node(b - 1), node(b + 1)
+            return (
+                d(qa0, qb) + d(qb, qa1) + d(qb0, qa) + d(qa, qb1)
+                - d(qa0, qa) - d(qa, qa1) - d(qb0, qb) - d(qb, qb1)
+                # adjacent cities share an edge, which the above counts twice
+                + np.where(b - a == 1, 2 * d(qa, qb), 0.0)
+            )
+
+        if operator == "inversion":
+            # reversing path[i:j] replaces the edges on both ends of the segment
+            inner = (
+                d(node(i), node(j)) + d(node(i + 1), node(j + 1))
+                - d(node(i), node(i + 1)) - d(node(j), node(j + 1))
+            )
+
+            # the wrapped segment seg = path[i:] + path[:j + 1] passes the depot, which
+            # stays in place. Reversing it changes the edges on both ends of seg, the
+            # edges around the depot, and which pair of cities in seg is split by it.
+            m = n - i
+            length = m + j + 1
+            seg = lambda k: paths[rows, (i + k) % n]
+            first, last = seg(0), seg(length - 1)
+            before, after = paths[rows, i - 1], paths[rows, (j + 1) % n]
+            split0, split1 = seg(m - 1), seg(m)
+            new0, new1 = seg(length - m - 1), seg(length - m)
+            wrapped = (
+                d(new1, self.depot) + d(self.depot, new0) + d(split0, split1)
+                - d(split0, self.depot) - d(self.depot, split1) - d(new0, new1)
+                # when seg covers the whole path its ends stay neighbours
+                + np.where(
+                    length < n,
+                    d(before, last) + d(first, after) - d(before, first) - d(last, after),
+                    0.0,
+                )
+            )
+            return np.where(i < j, inner, wrapped)
+
+        raise ValueError(f"Unknown operator {operator}")
 
     def create_path(self, path_idx: np.ndarray) -> np.ndarray:
-        """Convert an integer path to a matrix of lng, lat values, with Leiden pre- and appended"""
+        """Convert an integer path to a matrix of lng, lat values, with the depot pre- and appended"""
 
         return np.vstack(
             [
-                LEIDEN,
-                self.data.iloc[path_idx][["capital_lng", "capital_lat"]].values,
-                LEIDEN,
+                self.depot_coordinates,
+                self.coordinates[path_idx],
+                self.depot_coordinates,
             ]
         )
 
-    def plot_route(self, path: np.ndarray, route_length: float = float("inf")) -> None:
+    def plot_route(
+        self, path: np.ndarray, route_length: float = float("inf"), force: bool = False
+    ) -> None:
         """Plot the route on the map of Europe, interactively.
 
+        At most fps updates are drawn per second, an update that comes sooner is only drawn
+        when no newer update follows, at the latest when the plot is closed. Only the route
+        and its legend are redrawn (blitted) on top of a cached image of the map.
+
         Parameters
         ----------
         path: np.ndarray
@@ -260,27 +698,63 @@ class TSP:
             of lng, lat values.
         route_length: float = inf (optional)
             The length of the route, to display in the plot, optional.
+        force: bool = False (optional)
+            Draw this update, even if it comes sooner than fps allows.
 
         """
         if self.plot:
             if len(path.shape) == 1:
                 path = self.create_path(path)
 
-            if self.line is not None:
-                self.line[0].remove()
-                self.legend.remove()
-
-            self.line = self.ax.plot(
+            now = time.perf_counter()
+            if not force and self.fps and now - self._last_draw < 1 / self.fps:
+                self._pending = path, route_length
+                return
+            self._pending = None
+            self._last_draw = now
+            self._draw_route(path, route_length)
+
+    def _draw_route(self, path: np.ndarray, route_length: float) -> None:
+        """Draw a route (as a matrix of lng, lat values) on the plot, see plot_route"""
+
+        label = f"route length: {route_length:.2f} km"
+        canvas = self.ax.figure.canvas
+        if self.line is None:
+            # the route and legend are animated, so they are left out of the cached background
+            (self.line,) = self.ax.plot(
                 path[:, 0],
                 path[:, 1],
                 color="green",
                 linestyle="--",
                 alpha=0.9,
-                label=f"route length: {route_length:.2f} km",
+                label=label,
+                animated=True,
             )
-            self.legend = plt.legend()
-            plt.draw()
-            plt.pause(0.0001)
+            self.legend = self.ax.legend()
+            self.legend.set_animated(True)
+            canvas.mpl_connect("draw_event", self._on_draw)
+            canvas.draw()
+        else:
+            self.line.set_data(path[:, 0], path[:, 1])
+            self.legend.get_texts()[0].set_text(label)
+            if self._background is None or not canvas.supports_blit:
+                canvas.draw_idle()
+            else:
+                canvas.restore_region(self._background)
+                self._draw_animated()
+                canvas.blit(self.ax.figure.bbox)
+        canvas.flush_events()
+
+    def _on_draw(self, event) -> None:
+        """Cache the background after every full redraw, e.g. after a resize"""
+
+        canvas = self.ax.figure.canvas
+        self._background = canvas.copy_from_bbox(self.ax.figure.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self) -> None:
+        self.ax.draw_artist(self.line)
+        self.ax.draw_artist(self.legend)
 
 
 if __name__ == "__main__":